@@ -5,16 +5,33 @@ import math
 
 import trueskill
 from trueskill import *
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Dict
+from collections.abc import Mapping
 import csv
+import bisect
 import collections
+import concurrent.futures
+import heapq
+import itertools
 import json
 import shutil
 import os
 
+import numpy as np
 
-@dataclass
+from ratingengine import TwoTeamEngine, replay_matches, cdf
+from snapshotstore import SnapshotStore
+from ratinghistory import RatingHistory
+from statecache import load_state, save_state
+from binarydataset import BinaryDataset
+from playermodel import PlayerModel, RatingsView, CounterView
+from pairstats import PairStatsStore
+from matchscheduler import schedule_waves, interaction_components, partition_components
+from instrumentation import Instrumentation, instrumented
+
+
+@dataclass(slots=True)
 class RatingsUpdate:
     '''Class for reporting on the change in ratings after a match for a given player.'''
     tournament: str
@@ -27,8 +44,65 @@ class RatingsUpdate:
     losses: int
 
 
+@dataclass(slots=True)
+class MatchUpdate:
+    '''Class for reporting on the change in ratings after a match for both teams at once.
+
+    Rosters are arrays of PlayerModel ids in the same order as KQTrueSkill.teams, and each roster has parallel
+    arrays of mu & sigma from before and after the match. Bots aren't included.'''
+    match_index: int
+    tournament: str
+    tournament_id: int
+    bracket: str
+    team1name: str
+    team2name: str
+    team1_names: []
+    team2_names: []
+    team1: np.ndarray
+    team2: np.ndarray
+    old_mu1: np.ndarray
+    old_sigma1: np.ndarray
+    new_mu1: np.ndarray
+    new_sigma1: np.ndarray
+    old_mu2: np.ndarray
+    old_sigma2: np.ndarray
+    new_mu2: np.ndarray
+    new_sigma2: np.ndarray
+    team1wins: int
+    team2wins: int
+    cached_ratings_updates: [] = field(default=None, repr=False)
+
+    # one RatingsUpdate per player, team 1 first. built once per match, however many observers ask
+    def ratings_updates(self) -> []:
+        if self.cached_ratings_updates is None:
+            updates = []
+            for i, player in enumerate(self.team1_names):
+                updates.append(RatingsUpdate(
+                    tournament=self.tournament,
+                    my_team_name=self.team1name,
+                    their_team_name=self.team2name,
+                    my_player_name=player,
+                    my_old_rating=Rating(mu=float(self.old_mu1[i]), sigma=float(self.old_sigma1[i])),
+                    my_new_rating=Rating(mu=float(self.new_mu1[i]), sigma=float(self.new_sigma1[i])),
+                    wins=self.team1wins,
+                    losses=self.team2wins))
+            for i, player in enumerate(self.team2_names):
+                updates.append(RatingsUpdate(
+                    tournament=self.tournament,
+                    my_team_name=self.team2name,
+                    their_team_name=self.team1name,
+                    my_player_name=player,
+                    my_old_rating=Rating(mu=float(self.old_mu2[i]), sigma=float(self.old_sigma2[i])),
+                    my_new_rating=Rating(mu=float(self.new_mu2[i]), sigma=float(self.new_sigma2[i])),
+                    wins=self.team2wins,
+                    losses=self.team1wins))
+            self.cached_ratings_updates = updates
+        return self.cached_ratings_updates
+
+
 class AggregatedMatchStats:
     '''AggregatedMatchStats summarizes a series of RatingsUpdate.'''
+    __slots__ = ('wins', 'losses', 'net_rating_change', 'tournaments')
 
     def __init__(self):
         self.wins = 0
@@ -52,84 +126,465 @@ class AggregatedMatchStats:
 
 
 class RatingsChangeObserver:
+    '''Observers are sent a MatchUpdate for every rated match, via observe_match. By default that calls
+    observe with a RatingsUpdate for every player in the match; observers that can work on whole rosters at once
+    should override observe_match instead.
+
+    Every observer must also implement reset, checkpoint & restore. KQTrueSkill resets its observers before
+    calculating history from the start, and checkpoints them at every tournament boundary so it can rewind them
+    and replay part of history. A checkpoint is taken for every tournament, so it should only save what has
+    changed since the last one, eg an undo log like PairStatsStore's, not a copy of everything observed.'''
+
     def __init__(self, teams):
         self.teams = teams
 
+    def observe_match(self, match_update: MatchUpdate) -> None:
+        for ratings_update in match_update.ratings_updates():
+            self.observe(ratings_update)
+
     def observe(self, ratings_update: RatingsUpdate) -> None:
         pass
 
+    # forget everything observed so far, including checkpoints
+    def reset(self) -> None:
+        raise Exception(f"{type(self).__name__} must implement reset")
 
-def double_keyed_match_stats():
-    return collections.defaultdict(
-        lambda: collections.defaultdict(AggregatedMatchStats))
+    # returns a token to hand to restore()
+    def checkpoint(self) -> int:
+        raise Exception(f"{type(self).__name__} must implement checkpoint")
 
-    
-class RatingsChangeByOpponent(RatingsChangeObserver):
-    def __init__(self, teams):
+    # rewind to a checkpoint. later checkpoints are discarded, the restored one stays usable
+    def restore(self, checkpoint: int) -> None:
+        raise Exception(f"{type(self).__name__} must implement restore")
+
+
+class PairStatsObserver(RatingsChangeObserver):
+    '''Aggregates MatchUpdates by pairs of players in a PairStatsStore, keyed by player & tournament ids.
+    self.stats[my_name][other_name] reads them back as AggregatedMatchStats.'''
+
+    def __init__(self, teams, player_model: PlayerModel, tournament_ids: dict):
         super().__init__(teams)
-        self.ratings_change_by_opp = double_keyed_match_stats()
+        self.player_model = player_model
+        self.tournament_ids = tournament_ids
+        self.store = PairStatsStore()
+        self.stats = PairStatsView(self)
+
+    def reset(self) -> None:
+        self.__init__(self.teams, self.player_model, self.tournament_ids)
+
+    # every player in me gets one match against every player in other, in player order
+    @staticmethod
+    def pairs(me: np.ndarray, other: np.ndarray, rating_changes: np.ndarray):
+        return np.repeat(me, len(other)), np.tile(other, len(me)), np.repeat(rating_changes, len(other))
+
+    def checkpoint(self) -> int:
+        return self.store.checkpoint()
+
+    def restore(self, checkpoint: int) -> None:
+        self.store.restore(checkpoint)
+
+
+class PairStatsView(Mapping):
+    '''stats[my_name] = {other_name: AggregatedMatchStats} for every player my_name has met, in the order they
+    first met. The stats are built from the observer's PairStatsStore on demand; an unknown player has none.'''
+
+    def __init__(self, observer: PairStatsObserver):
+        self.observer = observer
+        self.tournament_names = []  # tournament_names[tournament id], extended as tournaments are added
+
+    def __getitem__(self, my_name: str) -> dict:
+        model = self.observer.player_model
+        store = self.observer.store
+        if my_name not in model.ids:
+            return {}
+        # tournament ids are dense & handed out in insertion order, so the names only change when one is added
+        if len(self.tournament_names) != len(self.observer.tournament_ids):
+            self.tournament_names = list(self.observer.tournament_ids)
+        tournament_names = self.tournament_names
+        stats = {}
+        for row in store.rows_of(model.ids[my_name]):
+            match_stats = AggregatedMatchStats()
+            match_stats.wins = int(store.wins[row])
+            match_stats.losses = int(store.losses[row])
+            match_stats.net_rating_change = float(store.net_rating_change[row])
+            match_stats.tournaments = {tournament_names[i] for i in store.tournament_ids(row)}
+            stats[model.names[store.other_ids[row]]] = match_stats
+        return stats
+
+    def __iter__(self):
+        model = self.observer.player_model
+        store = self.observer.store
+        return iter([model.names[my_id] for my_id in store.player_ids()])
+
+    def __len__(self):
+        return len(self.observer.store.player_rows)
+
+
+class RatingsChangeByOpponent(PairStatsObserver):
+    def __init__(self, teams, player_model: PlayerModel, tournament_ids: dict):
+        super().__init__(teams, player_model, tournament_ids)
+        self.ratings_change_by_opp = self.stats
+
+    def observe_match(self, match_update: MatchUpdate):
+        m = match_update
+        my_ids1, opp_ids1, changes1 = self.pairs(m.team1, m.team2, m.new_mu1 - m.old_mu1)
+        my_ids2, opp_ids2, changes2 = self.pairs(m.team2, m.team1, m.new_mu2 - m.old_mu2)
+        self.store.aggregate(np.concatenate((my_ids1, my_ids2)).tolist(),
+                             np.concatenate((opp_ids1, opp_ids2)).tolist(),
+                             np.repeat([m.team1wins, m.team2wins], [len(my_ids1), len(my_ids2)]),
+                             np.repeat([m.team2wins, m.team1wins], [len(my_ids1), len(my_ids2)]),
+                             np.concatenate((changes1, changes2)),
+                             m.tournament_id)
+
+
+class RatingsChangeByTeammate(PairStatsObserver):
+    def __init__(self, teams, player_model: PlayerModel, tournament_ids: dict):
+        super().__init__(teams, player_model, tournament_ids)
+        self.ratings_change_by_teammate = self.stats
+
+    def observe_match(self, match_update: MatchUpdate):
+        m = match_update
+        my_ids1, mate_ids1, changes1 = self.pairs(m.team1, m.team1, m.new_mu1 - m.old_mu1)
+        my_ids2, mate_ids2, changes2 = self.pairs(m.team2, m.team2, m.new_mu2 - m.old_mu2)
+        wins = np.repeat([m.team1wins, m.team2wins], [len(my_ids1), len(my_ids2)])
+        losses = np.repeat([m.team2wins, m.team1wins], [len(my_ids1), len(my_ids2)])
+        my_ids = np.concatenate((my_ids1, my_ids2))
+        mate_ids = np.concatenate((mate_ids1, mate_ids2))
+        changes = np.concatenate((changes1, changes2))
+        keep = my_ids != mate_ids
+        self.store.aggregate(my_ids[keep].tolist(), mate_ids[keep].tolist(), wins[keep], losses[keep], changes[keep],
+                             m.tournament_id)
+
+
+class PredictionStats:
+    '''Running totals for games predicted before they were rated. calibration_games[b], calibration_wins[b] &
+    calibration_probability[b] count the games whose team 1 win probability fell in bin b of calibration_bins,
+    the games team 1 won, and the sum of the predictions.'''
+    __slots__ = ('games', 'log_likelihood', 'brier', 'correct', 'calibration_games', 'calibration_wins',
+                 'calibration_probability')
+    calibration_bins = 10
 
-    def observe(self, update: RatingsUpdate):
-        my_name = update.my_player_name
-            
-        for opp_name in self.teams[update.tournament][update.their_team_name]:
-            self.ratings_change_by_opp[my_name][opp_name].aggregate(update)
+    def __init__(self):
+        self.games = 0
+        self.log_likelihood = 0.0
+        self.brier = 0.0
+        self.correct = 0.0  # a 50/50 prediction is half right whoever wins
+        self.calibration_games = [0] * self.calibration_bins
+        self.calibration_wins = [0] * self.calibration_bins
+        self.calibration_probability = [0.0] * self.calibration_bins
+
+    # team1wins & team2wins games of a match, each predicted as a team 1 win with probability p
+    def add(self, p: float, team1wins: int, team2wins: int) -> None:
+        self.games += team1wins + team2wins
+        self.log_likelihood += team1wins * math.log(max(p, 1e-300)) + team2wins * math.log(max(1 - p, 1e-300))
+        self.brier += team1wins * (1 - p) ** 2 + team2wins * p ** 2
+        self.correct += team1wins if p > 0.5 else team2wins if p < 0.5 else (team1wins + team2wins) / 2
+        b = min(int(p * self.calibration_bins), self.calibration_bins - 1)
+        self.calibration_games[b] += team1wins + team2wins
+        self.calibration_wins[b] += team1wins
+        self.calibration_probability[b] += (team1wins + team2wins) * p
+
+    # totals for a batch of matches at once: p[i] is the team 1 game win probability of the match team1wins[i],
+    # team2wins[i] came from
+    @classmethod
+    def from_arrays(cls, p: np.ndarray, team1wins: np.ndarray, team2wins: np.ndarray):
+        stats = cls()
+        games = team1wins + team2wins
+        stats.games = int(games.sum())
+        stats.log_likelihood = float((team1wins * np.log(np.maximum(p, 1e-300)) +
+                                      team2wins * np.log(np.maximum(1 - p, 1e-300))).sum())
+        stats.brier = float((team1wins * (1 - p) ** 2 + team2wins * p ** 2).sum())
+        stats.correct = float(np.where(p > 0.5, team1wins, np.where(p < 0.5, team2wins, games / 2)).sum())
+        bins = np.minimum((p * cls.calibration_bins).astype(np.int64), cls.calibration_bins - 1)
+        stats.calibration_games = np.bincount(bins, games, cls.calibration_bins).astype(np.int64).tolist()
+        stats.calibration_wins = np.bincount(bins, team1wins, cls.calibration_bins).astype(np.int64).tolist()
+        stats.calibration_probability = np.bincount(bins, games * p, cls.calibration_bins).tolist()
+        return stats
+
+    def __iadd__(self, other):
+        self.games += other.games
+        self.log_likelihood += other.log_likelihood
+        self.brier += other.brier
+        self.correct += other.correct
+        for b in range(self.calibration_bins):
+            self.calibration_games[b] += other.calibration_games[b]
+            self.calibration_wins[b] += other.calibration_wins[b]
+            self.calibration_probability[b] += other.calibration_probability[b]
+        return self
+
+    def mean_log_likelihood(self) -> float:
+        return self.log_likelihood / self.games if self.games else 0.0
+
+    def brier_score(self) -> float:
+        return self.brier / self.games if self.games else 0.0
+
+    def accuracy(self) -> float:
+        return self.correct / self.games if self.games else 0.0
+
+    # [(mean predicted team 1 win probability, observed team 1 win rate, games), ...] for each non empty bin
+    def calibration(self) -> []:
+        return [(self.calibration_probability[b] / self.calibration_games[b],
+                 self.calibration_wins[b] / self.calibration_games[b],
+                 self.calibration_games[b])
+                for b in range(self.calibration_bins) if self.calibration_games[b] > 0]
 
+    def __repr__(self):
+        return (
+            f'games {self.games}, '
+            f'log_likelihood {self.mean_log_likelihood():.4f}, '
+            f'brier {self.brier_score():.4f}, '
+            f'accuracy {self.accuracy():.3f}')
 
-class RatingsChangeByTeammate(RatingsChangeObserver):
-    def __init__(self, teams):
+
+class PredictionEvaluator(RatingsChangeObserver):
+    '''Scores how well the ratings predict each match before it's rated: every game of a match is predicted
+    from the ratings going into it, like win_probability_teams with bots, and scored by log-likelihood, Brier
+    score, accuracy & calibration. Totals are kept per (tournament, bracket); see totals & report.
+
+    With out, a text stream, one csv row per match is written as it's rated. A recalculation writes the matches
+    it replays again.
+
+    Checkpoints are undo logs, like PairStatsStore's: the first time a (tournament, bracket)'s totals change
+    after a checkpoint, a copy of the old totals is saved (None if there were none yet).'''
+
+    def __init__(self, teams, beta: float, bot: Rating, out=None):
         super().__init__(teams)
-        self.ratings_change_by_teammate = double_keyed_match_stats()
+        self.beta = beta
+        self.bot = bot
+        self.out = out
+        self.stats = {}  # stats[(tournament, bracket)] = PredictionStats
+        self.writer = None  # csv writer on out, started with a header at the first match of each run
+        self.undo_logs = []  # per checkpoint, {(tournament, bracket): PredictionStats or None}
+
+    def reset(self) -> None:
+        self.__init__(self.teams, self.beta, self.bot, self.out)
+
+    def observe_match(self, match_update: MatchUpdate) -> None:
+        m = match_update
+        bots1 = max(0, 5 - len(m.team1))
+        bots2 = max(0, 5 - len(m.team2))
+        delta_mu = float(m.old_mu1.sum()) + bots1 * self.bot.mu - float(m.old_mu2.sum()) - bots2 * self.bot.mu
+        sum_sigma = (float((m.old_sigma1 ** 2).sum()) + float((m.old_sigma2 ** 2).sum()) +
+                     (bots1 + bots2) * self.bot.sigma ** 2)
+        size = len(m.team1) + bots1 + len(m.team2) + bots2
+        # the normal cdf of one value, without going through numpy
+        p = 0.5 * (1 + math.erf(delta_mu / math.sqrt(2 * (size * self.beta ** 2 + sum_sigma))))
+
+        key = (m.tournament, m.bracket)
+        if self.undo_logs and key not in self.undo_logs[-1]:
+            self.undo_logs[-1][key] = copy.deepcopy(self.stats.get(key))
+        if key not in self.stats:
+            self.stats[key] = PredictionStats()
+        stats = self.stats[key]
+        log_likelihood = stats.log_likelihood
+        stats.add(p, m.team1wins, m.team2wins)
+        if self.out is not None:
+            if self.writer is None:
+                self.writer = csv.writer(self.out)
+                self.writer.writerow(["match", "tournament", "bracket", "team1", "team2", "team1 win probability",
+                                      "team1wins", "team2wins", "log likelihood"])
+            self.writer.writerow([m.match_index, m.tournament, m.bracket, m.team1name, m.team2name, p,
+                                  m.team1wins, m.team2wins, stats.log_likelihood - log_likelihood])
+
+    # totals grouped by 'tournament', 'bracket', 'tournament bracket' (keys are (tournament, bracket)), or
+    # everything under the key 'all' with by=None
+    def totals(self, by: str = None) -> dict:
+        totals = {}
+        for (tournament, bracket), stats in self.stats.items():
+            key = {None: 'all', 'tournament': tournament, 'bracket': bracket,
+                   'tournament bracket': (tournament, bracket)}[by]
+            if key not in totals:
+                totals[key] = PredictionStats()
+            totals[key] += stats
+        return totals
+
+    def report(self, by: str = 'tournament') -> str:
+        lines = []
+        for key, stats in list(self.totals(by).items()) + list(self.totals().items()):
+            lines.append(f"{key}: {stats}")
+        lines.append("calibration (predicted, observed, games): " +
+                     ", ".join(f"({p:.2f}, {w:.2f}, {g})" for p, w, g in self.totals().get('all', PredictionStats())
+                               .calibration()))
+        return "\n".join(lines)
+
+    def checkpoint(self) -> int:
+        self.undo_logs.append({})
+        return len(self.undo_logs) - 1
+
+    # rewind to a checkpoint. later checkpoints are discarded, the restored one stays usable
+    def restore(self, checkpoint: int) -> None:
+        for undo_log in reversed(self.undo_logs[checkpoint:]):
+            for key, stats in undo_log.items():
+                if stats is None:
+                    del self.stats[key]
+                else:
+                    self.stats[key] = stats
+        del self.undo_logs[checkpoint + 1:]
+        self.undo_logs[checkpoint] = {}
+
+    # streams don't pickle; a loaded evaluator stops writing rows. undo logs only make sense next to the
+    # checkpoints they were made for, which aren't saved
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['out'] = None
+        state['writer'] = None
+        state['undo_logs'] = []
+        return state
 
-    def observe(self, update: RatingsUpdate):
-        my_name = update.my_player_name
-        for teammate_name in self.teams[update.tournament][update.my_team_name]:
-            if teammate_name != my_name:
-                self.ratings_change_by_teammate[my_name][teammate_name].aggregate(
-                    update)
+
+@dataclass
+class Checkpoint:
+    '''Everything calculate_trueskills needs to resume from the first match of a tournament.'''
+    match_index: int
+    current_tournament: str
+    player_state: tuple  # PlayerModel.copy_state()
+    snapshot_epochs: dict
+    snapshot_epoch_count: int
+    observer_checkpoints: []
 
         
 def sort_tournaments_by_date(tournament_list, history):
     return sorted(tournament_list,
                   key=lambda t: history.tournamentdates[t])
 
+
+def match_time(match):
+    return match["time"]
+
+
+# a match dict as a match results row: [tournament, bracket, team1name, team2name, team1wins, team2wins, time]
+def match_row(match) -> []:
+    return [match["tournament"], match["bracket"], match["team1name"], match["team2name"], match["team1wins"],
+            match["team2wins"], match["time"]]
+
+
+# returns the header & the rows after it, as [tournament, team, player, scene]
+def read_player_file(filename: str):
+    with open(filename) as csv_file:
+        rows = list(csv.reader(csv_file, delimiter=','))
+    return rows[0], [row[:4] for row in rows[1:]]
+
+
+# player rows with a blank team given the team of the row before, as player files leave the team blank after
+# a team's first player. a blank team before any named one becomes None
+def fill_blank_teams(rows: []) -> []:
+    filled = []
+    last_seen_team = None
+    for row in rows:
+        if row[1] is None or row[1].strip() == '':
+            row = [row[0], last_seen_team, *row[2:]]
+        else:
+            last_seen_team = row[1]
+        filled.append(row)
+    return filled
+
+
+# returns the header & the rows after it, as [tournament, bracket, team1name, team2name, team1wins, team2wins, time]
+def read_match_file(filename: str, datetime_format: str):
+    with open(filename) as csv_file:
+        rows = list(csv.reader(csv_file, delimiter=','))
+    return rows[0], [[row[0], row[1], row[2], row[3], int(row[4]), int(row[5]),
+                      datetime.datetime.strptime(row[6], datetime_format)] for row in rows[1:]]
+
+
+# parse one dataset without touching any KQTrueSkill state, so it can run in a worker process.
+# returns (playerfile, player header, player rows, matchfile, match rows) for ingest_parsed_datasets
+def read_dataset(playerfile: str, matchfile: str, datetime_format: str):
+    player_header, player_rows = read_player_file(playerfile)
+    _, match_rows = read_match_file(matchfile, datetime_format)
+    return playerfile, player_header, player_rows, matchfile, match_rows
+
                 
 class KQTrueSkill:
     datetime_format: str = "%Y-%m-%dT%H:%M:%S%z"
 
-    def __init__(self):
-        trueskill.setup(trueskill.MU, trueskill.SIGMA, trueskill.BETA, trueskill.TAU, draw_probability=0)
-        self.snapshots = {}  # self.snapshots[tournament] = {'playername' = , 'trueskill' = }
+    # model parameters: trueskill's beta & tau, and the rating of the bots that fill out short teams.
+    # see sweep.py for measuring how they affect predictions
+    beta: float = trueskill.BETA
+    tau: float = trueskill.TAU
+    bot_mu: float = 5.000
+    bot_sigma: float = 2
+
+    # brackets that are still rated when group stages are excluded
+    knockout_brackets: set = {"KO", "Knockout", "WC", "Wildcard"}
+
+    # the known good datasets, as (player file, match results file). processed in this order
+    approved_datasets: [] = [
+        ('datasets/2019 Players.csv', 'datasets/2019 game results.csv'),
+        ('datasets/SF-PDX-SEA-LA Players.csv', 'datasets/SF-PDX-SEA-LA game results.csv'),
+        ('datasets/BB Players.csv', 'datasets/BB game results.csv'),
+        ('datasets/CC Players.csv', 'datasets/CC game results.csv'),
+        ('datasets/Midwest players.csv', 'datasets/Midwest game results.csv'),
+        ('datasets/Coronation players.csv', 'datasets/Coronation game results.csv'),
+        ('datasets/2021 Players.csv', 'datasets/2021 game results.csv'),
+    ]
+
+    # state_file: optional saved state to warm start from. if it's missing or out of date, the datasets are
+    # processed as usual and the new state is saved there. instrumentation: an enabled Instrumentation to time
+    # stages & count work from the start, see instrumentation.py
+    def __init__(self, state_file: str = None, instrumentation: Instrumentation = None):
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        trueskill.setup(trueskill.MU, trueskill.SIGMA, self.beta, self.tau, draw_probability=0)
+        self.snapshots = {}  # self.snapshots[tournament][playername] = Rating, see SnapshotStore
+        self.unsnapshotted_players = set()  # ids of players whose rating changed since the last snapshot
+        self.rating_history = None  # every rating update by player, for point in time queries. see RatingHistory
+        self.current_tournament: str = ''  # tournament of the last rated match
+        self.out_of_order_matches = []  # live matches accepted with allow_out_of_order, see add_match
+        self.checkpoints: [] = []  # Checkpoints at tournament boundaries, in match order. see recalculate_from
+        # checkpoint at the first tournament boundary at least this many matches after the last checkpoint.
+        # 0 checkpoints every tournament, None turns checkpoints off
+        self.checkpoint_interval: int = 0
+        # worker processes for replaying history, see replay_components. default one per cpu, 1 replays here
+        self.replay_processes: int = None
+        self.replay_window: int = 100  # matches per replay_components window
         self.matches: [] = []
+        self.excluded_matches: [] = []  # group stage matches left out by use_groups, see set_use_groups
+        # every ingested row by (tournament, bracket, team pair, time), to catch rows reported twice, see
+        # duplicate_errors
+        self.ingested_rows = {}
+        # ratings & w/l counts live in arrays indexed by player id. playerratings, playergames, playerwins &
+        # playerlosses are views keyed by playername
+        self.player_model = PlayerModel(Rating())
         self.playerscenes = {}
         self.playerteams = {}
-        self.playerratings = {}
+        self.playerratings = RatingsView(self.player_model)
         self.playertournaments = {}  # playertournaments[playername] = ["BB4","KQ30",...]
-        self.playergames = {}
-        self.playerwins = {}
-        self.playerlosses = {}
+        self.playergames = CounterView(self.player_model, 'games')
+        self.playerwins = CounterView(self.player_model, 'wins')
+        self.playerlosses = CounterView(self.player_model, 'losses')
         self.incomplete_players = []  # list of playernames w/o scenes
         self.incomplete_teams = {} # dict of tourneys & teams with missing player info
         self.tournaments = []
         self.tournamentdates = {}  # source data only ties matches directly to a date.
         self.teams = {}  # [tournament][team name] = {p1, p2, p3...}
+        self.tournament_ids = {}  # tournament_ids[tournament] = dense tournament id
+        self.team_ids = {}  # team_ids[(tournament, team name)] = dense team id
+        self.rosters = []  # rosters[team id] = array of player ids, in the same order as self.teams
         self.output_file_name: str = '../PlayerSkill.csv'
-        self.ratings_change_by_opponent = RatingsChangeByOpponent(self.teams)
-        self.ratings_change_by_teammate = RatingsChangeByTeammate(self.teams)
-        self.observers = [self.ratings_change_by_opponent, self.ratings_change_by_teammate]
+        self.ratings_change_by_opponent = RatingsChangeByOpponent(self.teams, self.player_model, self.tournament_ids)
+        self.ratings_change_by_teammate = RatingsChangeByTeammate(self.teams, self.player_model, self.tournament_ids)
+        # pre-match predictions scored as matches are rated, see PredictionEvaluator
+        self.predictions = PredictionEvaluator(self.teams, trueskill.global_env().beta, self.create_bot())
+        self.observers = [self.ratings_change_by_opponent, self.ratings_change_by_teammate, self.predictions]
         self.displayname_map = {}
-        
+        self.rating_engine = TwoTeamEngine()
+
+        if state_file is not None:
+            with self.instrumentation.stage('state'):
+                loaded = load_state(self, state_file, self.approved_datasets)
+            if loaded:
+                print(f"loaded saved state from {state_file}")
+                return
+
         self.process_approved_datasets()
 
+        if state_file is not None:
+            with self.instrumentation.stage('state'):
+                save_state(self, state_file, self.approved_datasets)
+
     # ingest the known good datasets automatically
     def process_approved_datasets(self):
-        self.ingest_dataset('datasets/2019 Players.csv', 'datasets/2019 game results.csv')
-        self.ingest_dataset('datasets/SF-PDX-SEA-LA Players.csv', 'datasets/SF-PDX-SEA-LA game results.csv')
-        self.ingest_dataset('datasets/BB Players.csv', 'datasets/BB game results.csv')
-        self.ingest_dataset('datasets/CC Players.csv', 'datasets/CC game results.csv')
-        self.ingest_dataset('datasets/Midwest players.csv', 'datasets/Midwest game results.csv')
-        self.ingest_dataset('datasets/Coronation players.csv', 'datasets/Coronation game results.csv')
-        self.ingest_dataset('datasets/2021 Players.csv', 'datasets/2021 game results.csv')
+        self.ingest_datasets(self.approved_datasets)
 
         # run trueskill on the matches
         self.calculate_trueskills()
@@ -141,109 +596,505 @@ class KQTrueSkill:
         # self.calculate_trueskills()
 
     def ingest_dataset(self, playerfile: str, matchfile: str):
-        # must ingest players first
-        # reports new players found in this file
-        self.ingest_players_from_file(playerfile)
-
-        # expect Exceptions if your team names don't match
-        self.ingest_matches_from_file(matchfile)
-
-        # ensure matches will always process in historical order
-        self.matches = sorted(self.matches, key=lambda match: match["time"])
+        self.ingest_datasets([(playerfile, matchfile)])
+
+    # ingest [(player file, match results file), ...]. files are parsed concurrently in up to processes worker
+    # processes (default one per cpu, 1 parses in this process), but ingested in the order given: a dataset's
+    # matches can only name teams from its own player file or an earlier one
+    def ingest_datasets(self, datasets: [], processes: int = None):
+        if processes is None:
+            processes = os.cpu_count() or 1
+        processes = min(processes, len(datasets))
+        if processes <= 1:
+            self.ingest_parsed_datasets(read_dataset(playerfile, matchfile, self.datetime_format)
+                                        for playerfile, matchfile in datasets)
+            return
+
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            self.ingest_parsed_datasets(pool.map(read_dataset,
+                                                 [playerfile for playerfile, _ in datasets],
+                                                 [matchfile for _, matchfile in datasets],
+                                                 itertools.repeat(self.datetime_format)))
+
+    # ingest datasets from read_dataset, in order: players first, as matches are checked against them.
+    # each dataset's matches are sorted on their own, then merged once with the already tracked matches.
+    # the merge is stable, so matches with the same time keep their file order, exactly like re-sorting
+    # self.matches after every file
+    def ingest_parsed_datasets(self, parsed_datasets, use_groups: bool = True):
+        runs = [self.matches]
+        self.matches = []
+        tracked = len(runs[0])
+        try:
+            for playerfile, player_header, player_rows, matchfile, match_rows in \
+                    self.instrumentation.iterate(parsed_datasets, 'parse'):
+                with self.instrumentation.stage('ingest'):
+                    self.ingest_player_rows(player_header, player_rows, playerfile)
+
+                    # expect Exceptions if your team names don't match
+                    errors = self.ingest_match_rows(match_rows, use_groups, matchfile)
+                self.instrumentation.count('match rows ingested', len(match_rows))
+                tracked += len(self.matches)
+                print(f"Processed {len(match_rows)} matches, now tracking {tracked} matches.")
+                if errors != '':
+                    raise Exception(errors)
+                with self.instrumentation.stage('sort'):
+                    runs.append(sorted(self.matches, key=match_time))
+                self.matches = []
+        finally:
+            # ensure matches will always process in historical order
+            with self.instrumentation.stage('sort'):
+                runs.append(sorted(self.matches, key=match_time))
+                self.matches = list(heapq.merge(*runs, key=match_time))
+
+    # ingest a dataset written by binarydataset.convert_dataset. same checks & results as ingest_dataset on the
+    # csv files it was converted from, but straight from the interned id columns: rosters are built once per
+    # team rather than once per player, team names are checked once per distinct team, matches are sorted on
+    # the integer times, and datetimes are made in bulk only for the match dicts
+    def ingest_binary_dataset(self, filename: str, use_groups: bool = True):
+        dataset = BinaryDataset(filename)
+        run = []
+        try:
+            with self.instrumentation.stage('ingest'):
+                self.ingest_binary_players(dataset, filename)
+                run, errors = self.ingest_binary_matches(dataset, use_groups, filename)
+            self.instrumentation.count('match rows ingested', len(dataset.match_columns))
+            print(f"Processed {len(dataset.match_columns)} matches, now tracking "
+                  f"{len(self.matches) + len(run)} matches.")
+            if errors != '':
+                raise Exception(errors)
+        finally:
+            with self.instrumentation.stage('sort'):
+                self.matches = list(heapq.merge(self.matches, run, key=match_time))
+
+    def ingest_binary_players(self, dataset: BinaryDataset, filename: str):
+        print(f'Player List Column names are {", ".join(dataset.player_header)}')
+        tournaments, teams, players, scenes = dataset.tournaments, dataset.teams, dataset.players, dataset.scenes
+        tournament_ids = dataset.player_columns[:, 0]
+        team_ids = dataset.player_team_ids()
+        for t, team, p, s in zip(tournament_ids.tolist(), team_ids.tolist(), dataset.player_columns[:, 2].tolist(),
+                                 dataset.player_columns[:, 3].tolist()):
+            self.add_player(players[p], scenes[s], teams[team] if team >= 0 else None, tournaments[t],
+                            build_roster=False)
+        for t, team in dict.fromkeys(zip(tournament_ids.tolist(), team_ids.tolist())):
+            self.build_roster(tournaments[t], teams[team])
+        print(f'Processed {len(dataset.player_columns) + 1} players from {filename}.')
+
+    # the dataset's matches as dicts, sorted by time, plus the validation errors of every row. excluded
+    # brackets go to self.excluded_matches as ingest_match does
+    def ingest_binary_matches(self, dataset: BinaryDataset, use_groups: bool, filename: str):
+        columns = dataset.match_columns
+        tournaments, brackets, teams = dataset.tournaments, dataset.brackets, dataset.teams
+        # only rows naming an unknown tournament or team need match_errors' messages
+        known = {(t, team): tournaments[t] in self.teams and teams[team] in self.teams[tournaments[t]]
+                 for t, team in set(zip(columns[:, 0].tolist(), columns[:, 2].tolist())) |
+                 set(zip(columns[:, 0].tolist(), columns[:, 3].tolist()))}
+        times = dataset.match_times()
+        errors = ''
+        matches = []
+        included = []
+        for (t, b, team1, team2, team1wins, team2wins), time in zip(columns.tolist(), times):
+            tournament, bracket, team1name, team2name = tournaments[t], brackets[b], teams[team1], teams[team2]
+            if not (known[(t, team1)] and known[(t, team2)]):
+                errors += self.match_errors(tournament, team1name, team2name)
+            errors += self.duplicate_errors(tournament, bracket, team1name, team2name, team1wins, team2wins, time,
+                                            filename)
+            if tournament not in self.tournamentdates:
+                self.tournamentdates[tournament] = time.date()
+                print(f"sat {tournament} date to {time.strftime(KQTrueSkill.datetime_format)}")
+            match = {"tournament": tournament,
+                     "bracket": bracket,
+                     "team1name": team1name,
+                     "team2name": team2name,
+                     "team1wins": team1wins,
+                     "team2wins": team2wins,
+                     "time": time,
+                     }
+            matches.append(match)
+            if use_groups or bracket in self.knockout_brackets:
+                included.append(True)
+            else:
+                included.append(False)
+                self.excluded_matches.append(match)
+                print(f"use_groups is {use_groups}: Excluded {tournament}/{bracket}")
+        # a stable sort on the integer times keeps matches at the same time in file order, like sorted()
+        order = np.argsort(dataset.match_microseconds, kind='stable').tolist()
+        return [matches[i] for i in order if included[i]], errors
 
     # wipe old ratings objects and recalculate trueskill, compare new result with old ratings
     # side effect: update player games & w/l counts
     def calculate_trueskills(self):
 
-        # make clean ratings objects
-        self.playerratings = {}
-        for player in self.playerteams.keys():
-            self.playerratings[player] = Rating()
+        # fresh ratings & w/l counts
+        self.player_model.reset()
+        self.snapshots = SnapshotStore(self.playerratings)
+        self.unsnapshotted_players = set()
+        self.rating_history = RatingHistory(self.player_model)
+        self.checkpoints = []
+        for observer in self.observers:
+            observer.reset()
 
         # calculate complete history
-        current_tournament: str = ''
-        for m in self.matches:
-            t1ratings = []
-            t2ratings = []
-            tournament: str = m['tournament']
-            team1name: str = m['team1name']
-            team2name: str = m['team2name']
-            team1wins: int = m['team1wins']
-            team2wins: int = m['team2wins']
-
-            if current_tournament != tournament:
-                self.record_trueskill_snapshot(current_tournament)
-                current_tournament = tournament
-                print(f"processing {tournament}")
-
-            # Trueskill wants arrays of ratings objects for each player
-            # Order doesn't matter to trueskill, but it does matter to us, so preserve order as found in
-            # the teams collection
-            for player in self.teams[tournament][team1name]:
-                t1ratings.append(self.playerratings[player])
-                self.playergames[player] += team1wins + team2wins
-                self.playerwins[player] += team1wins
-                self.playerlosses[player] += team2wins
-
-
-            for player in self.teams[tournament][team2name]:
-                t2ratings.append(self.playerratings[player])
-                self.playergames[player] += team1wins + team2wins
-                self.playerwins[player] += team2wins
-                self.playerlosses[player] += team1wins
-
-            # teams with < 5 players are assumed to have played with bots.
-            # we include bots as very low skill players, and don't track the results of their games
-            if len(self.teams[tournament][team1name]) < 5:
-                print(f"found team with <5 players: {team1name}")
-                for _ in range(len(self.teams[tournament][team1name]), 5):
-                    t1ratings.append(self.create_bot())
-            if len(self.teams[tournament][team2name]) < 5:
-                print(f"found team with <5 players: {team2name}")
-                for _ in range(len(self.teams[tournament][team2name]), 5):
-                    t2ratings.append(self.create_bot())
-
+        self.current_tournament = ''
+        self.rate_matches(0)
+        self.record_trueskill_snapshot(self.current_tournament)
+
+    # player ids of a tournament team, in the same order as self.teams
+    def roster(self, tournament: str, team: str) -> np.ndarray:
+        return self.rosters[self.team_ids[(tournament, team)]]
+
+    # rate self.matches[first_index:]. with more than one replay process, see replay_components, otherwise a wave
+    # of player-disjoint matches at a time, see schedule_waves
+    def rate_matches(self, first_index: int):
+        processes = self.replay_processes or os.cpu_count() or 1
+        if processes <= 1 or len(self.matches) - first_index <= self.replay_window:
+            self.rate_waves(first_index, len(self.matches))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+                for start in range(first_index, len(self.matches), self.replay_window):
+                    self.replay_components(pool, processes, start,
+                                           min(start + self.replay_window, len(self.matches)))
+        self.instrumentation.tournament(None)
+
+    def rate_waves(self, start: int, stop: int):
+        matches = self.matches[start:stop]
+        with self.instrumentation.stage('schedule'):
+            players = [np.concatenate((self.roster(m['tournament'], m['team1name']),
+                                       self.roster(m['tournament'], m['team2name']))).tolist() for m in matches]
+            waves = schedule_waves([m['tournament'] for m in matches], players)
+        for wave_start, wave_stop in waves:
+            self.rate_wave(start + wave_start, matches[wave_start:wave_stop])
+
+    # replay self.matches[start:stop] split into groups of players who only meet each other within those matches,
+    # see interaction_components. each group is rated in a worker process against its own copy of its players'
+    # ratings, then the results are applied here in match order, so observers, snapshots, checkpoints & history
+    # get exactly what rate_waves would have given them
+    def replay_components(self, pool, processes: int, start: int, stop: int):
+        matches = self.matches[start:stop]
+        with self.instrumentation.stage('schedule'):
+            teams = [(self.roster(m['tournament'], m['team1name']), self.roster(m['tournament'], m['team2name']))
+                     for m in matches]
+            partitions = partition_components(
+                interaction_components([np.concatenate(t).tolist() for t in teams]), processes)
+        if len(partitions) <= 1:
+            self.rate_waves(start, stop)
+            return
+
+        with self.instrumentation.stage('rate'):
+            bot = self.create_bot()
+            tasks = []
+            for partition in partitions:
+                # worker ratings are indexed by position in players, which is sorted
+                players = np.unique(np.concatenate([np.concatenate(teams[j]) for j in partition]))
+                replay = [(np.searchsorted(players, teams[j][0]), np.searchsorted(players, teams[j][1]),
+                           matches[j]['team1wins'], matches[j]['team2wins']) for j in partition]
+                tasks.append(pool.submit(replay_matches, self.rating_engine, self.player_model.mu[players],
+                                         self.player_model.sigma[players], replay, bot.mu, bot.sigma))
+            self.instrumentation.count('replay tasks', len(tasks))
+
+            results = [None] * len(matches)
+            for partition, task in zip(partitions, tasks):
+                for j, result in zip(partition, task.result()):
+                    results[j] = result
+        for j, m in enumerate(matches):
+            new_mu1, new_sigma1, new_mu2, new_sigma2 = results[j]
+            self.apply_wave(start + j, [m], [new_mu1], [new_sigma1], [new_mu2], [new_sigma2])
+
+    # rate one match, updating ratings, w/l counts, observers and rating history.
+    # matches must be rated in the order they appear in self.matches
+    def rate_match(self, match_index: int, m):
+        self.rate_wave(match_index, [m])
+
+    # rate consecutive matches, self.matches[first_index:first_index + len(wave)], from one tournament with no
+    # player in more than one of them. the rating engine gets them as one batch; everything else sees them
+    # one by one, in order, exactly as if each had been rated on its own
+    def rate_wave(self, first_index: int, wave: []):
+        tournament: str = wave[0]['tournament']
+        model = self.player_model
+        with self.instrumentation.stage('rate'):
+            mu1, sigma1, mu2, sigma2 = [], [], [], []
+            for m in wave:
+                team1 = self.roster(tournament, m['team1name'])
+                team2 = self.roster(tournament, m['team2name'])
+                mu1.append(model.mu[team1])
+                sigma1.append(model.sigma[team1])
+                mu2.append(model.mu[team2])
+                sigma2.append(model.sigma[team2])
+            new_ratings = self.rate_wave_arrays(wave, mu1, sigma1, mu2, sigma2)
+        self.instrumentation.count('waves')
+        self.apply_wave(first_index, wave, *new_ratings)
+
+    # apply the new ratings of a wave from rate_wave, match by match: w/l counts, observers, the ratings themselves
+    # and rating history. a wave starting a new tournament snapshots & checkpoints first
+    def apply_wave(self, first_index: int, wave: [], new_mu1: [], new_sigma1: [], new_mu2: [], new_sigma2: []):
+        tournament: str = wave[0]['tournament']
+        instrumentation = self.instrumentation
+        instrumentation.tournament(tournament)
+        if self.current_tournament != tournament:
+            self.record_trueskill_snapshot(self.current_tournament)
+            self.current_tournament = tournament
+            if self.checkpoint_interval is not None and (
+                    len(self.checkpoints) == 0 or
+                    first_index - self.checkpoints[-1].match_index >= self.checkpoint_interval):
+                self.save_checkpoint(first_index)
+            print(f"processing {tournament}")
+
+        model = self.player_model
+        for j, m in enumerate(wave):
+            with instrumentation.stage('apply'):
+                # Order doesn't matter to trueskill, but it does matter to us, so preserve order as found in
+                # the teams collection
+                team1 = self.roster(tournament, m['team1name'])
+                team2 = self.roster(tournament, m['team2name'])
+                team1wins: int = m['team1wins']
+                team2wins: int = m['team2wins']
+                # add.at, so a player listed twice on a roster is counted twice
+                np.add.at(model.games, team1, team1wins + team2wins)
+                np.add.at(model.wins, team1, team1wins)
+                np.add.at(model.losses, team1, team2wins)
+                np.add.at(model.games, team2, team1wins + team2wins)
+                np.add.at(model.wins, team2, team2wins)
+                np.add.at(model.losses, team2, team1wins)
+
+                # teams with < 5 players are assumed to have played with bots.
+                # we include bots as very low skill players, and don't track the results of their games
+                if len(team1) < 5:
+                    print(f"found team with <5 players: {m['team1name']}")
+                if len(team2) < 5:
+                    print(f"found team with <5 players: {m['team2name']}")
+
+                match_update = MatchUpdate(
+                    match_index=first_index + j,
+                    tournament=tournament,
+                    tournament_id=self.tournament_ids[tournament],
+                    bracket=m['bracket'],
+                    team1name=m['team1name'],
+                    team2name=m['team2name'],
+                    team1_names=self.teams[tournament][m['team1name']],
+                    team2_names=self.teams[tournament][m['team2name']],
+                    team1=team1,
+                    team2=team2,
+                    old_mu1=model.mu[team1],
+                    old_sigma1=model.sigma[team1],
+                    new_mu1=new_mu1[j],
+                    new_sigma1=new_sigma1[j],
+                    old_mu2=model.mu[team2],
+                    old_sigma2=model.sigma[team2],
+                    new_mu2=new_mu2[j],
+                    new_sigma2=new_sigma2[j],
+                    team1wins=team1wins,
+                    team2wins=team2wins)
+            instrumentation.count_match(tournament, team1wins + team2wins)
+            instrumentation.count('matches rated')
+            instrumentation.count('games rated', team1wins + team2wins)
+            instrumentation.count('bots padded', max(0, 5 - len(team1)) + max(0, 5 - len(team2)))
+
+            with instrumentation.stage('observers'):
+                for observer in self.observers:
+                    observer.observe_match(match_update)
+            instrumentation.count('observer calls', len(self.observers))
+
+            with instrumentation.stage('apply'):
+                # now put the ratings back into the model
+                for team, mu, sigma in ((team1, new_mu1[j], new_sigma1[j]), (team2, new_mu2[j], new_sigma2[j])):
+                    model.mu[team] = mu
+                    model.sigma[team] = sigma
+                    self.unsnapshotted_players.update(team.tolist())
+                    self.rating_history.record_match(team.tolist(), first_index + j, m['time'], mu.tolist(),
+                                                     sigma.tolist())
+
+    # new mu & sigma for every team in a wave, given lists of each team's arrays. matches whose teams pad to the
+    # same sizes go to the rating engine together
+    def rate_wave_arrays(self, wave: [], mu1: [], sigma1: [], mu2: [], sigma2: []):
+        shapes = collections.defaultdict(list)
+        for j in range(len(wave)):
+            shapes[(max(5, len(mu1[j])), max(5, len(mu2[j])))].append(j)
+
+        new_mu1, new_sigma1, new_mu2, new_sigma2 = ([None] * len(wave) for _ in range(4))
+        for batch in shapes.values():
+            padded1 = [self.pad_with_bots(mu1[j], sigma1[j]) for j in batch]
+            padded2 = [self.pad_with_bots(mu2[j], sigma2[j]) for j in batch]
             # update ratings for each game win. since we don't have game order, alternate winners where you can
-            for x in range (max(team1wins,team2wins)):
-                if x < team1wins:
-                    t1ratings, t2ratings = rate([t1ratings, t2ratings], ranks=[0, 1])
-                if x < team2wins:
-                    t1ratings, t2ratings = rate([t1ratings, t2ratings], ranks=[1, 0])
+            self.instrumentation.count('engine calls')
+            batch_mu1, batch_sigma1, batch_mu2, batch_sigma2 = self.rating_engine.rate_matches_arrays(
+                np.array([mu for mu, _ in padded1]), np.array([sigma for _, sigma in padded1]),
+                np.array([mu for mu, _ in padded2]), np.array([sigma for _, sigma in padded2]),
+                np.array([wave[j]['team1wins'] for j in batch]), np.array([wave[j]['team2wins'] for j in batch]))
+            for row, j in enumerate(batch):
+                new_mu1[j], new_sigma1[j] = batch_mu1[row, :len(mu1[j])], batch_sigma1[row, :len(mu1[j])]
+                new_mu2[j], new_sigma2[j] = batch_mu2[row, :len(mu2[j])], batch_sigma2[row, :len(mu2[j])]
+        return new_mu1, new_sigma1, new_mu2, new_sigma2
+
+    @instrumented('checkpoint')
+    def save_checkpoint(self, match_index: int):
+        self.checkpoints.append(Checkpoint(
+            match_index=match_index,
+            current_tournament=self.current_tournament,
+            player_state=self.player_model.copy_state(),
+            snapshot_epochs=dict(self.snapshots.epochs),
+            snapshot_epoch_count=self.snapshots.epoch_count,
+            observer_checkpoints=[observer.checkpoint() for observer in self.observers]))
+
+    # rewind everything calculate_trueskills builds to self.checkpoints[i]. later checkpoints are dropped
+    @instrumented('checkpoint')
+    def restore_checkpoint(self, i: int):
+        checkpoint: Checkpoint = self.checkpoints[i]
+        del self.checkpoints[i + 1:]
+
+        self.current_tournament = checkpoint.current_tournament
+        self.unsnapshotted_players = set()
+        self.snapshots.truncate(checkpoint.snapshot_epoch_count, checkpoint.snapshot_epochs)
+        self.rating_history.truncate(checkpoint.match_index)
+        for observer, observer_checkpoint in zip(self.observers, checkpoint.observer_checkpoints):
+            observer.restore(observer_checkpoint)
+
+        # players added since the checkpoint start fresh, players removed since stay removed
+        self.player_model.restore_state(checkpoint.player_state)
+
+    # recalculate trueskill after self.matches or self.teams changed at or after match_index,
+    # resuming from the last checkpoint at or before it instead of replaying all of history
+    def recalculate_from(self, match_index: int):
+        checkpoint_indexes = [checkpoint.match_index for checkpoint in self.checkpoints]
+        i = bisect.bisect_right(checkpoint_indexes, match_index) - 1
+        if self.rating_history is None or i < 0:
+            self.calculate_trueskills()
+            return
+
+        self.restore_checkpoint(i)
+        self.rate_matches(self.checkpoints[i].match_index)
+        self.record_trueskill_snapshot(self.current_tournament)
+
+    # fix a scrubbed match, eg correct_match(i, team1wins=3, team2wins=1), and recalculate from there. the
+    # corrected row replaces the old one in ingested_rows, from the same source
+    def correct_match(self, match_index: int, **changes):
+        match = dict(self.matches[match_index])
+        match.update(changes)
+        errors = self.match_errors(match['tournament'], match['team1name'], match['team2name'])
+        if errors != '':
+            raise Exception(errors)
+        source = self.forget_ingested_row(self.matches[match_index])
+        errors = self.duplicate_errors(*match_row(match), source)
+        if errors != '':
+            self.forget_ingested_row(match)
+            self.duplicate_errors(*match_row(self.matches[match_index]), source)
+            raise Exception(errors)
 
+        old_match = self.matches.pop(match_index)
+        new_index = match_index
+        if match['time'] != old_match['time']:
+            new_index = bisect.bisect_right([m['time'] for m in self.matches], match['time'])
+        self.matches.insert(new_index, match)
+        self.recalculate_from(min(match_index, new_index))
+
+    # replace a tournament team's roster with [(playername, playerscene), ...] and recalculate from the
+    # team's first match
+    def correct_roster(self, tournament: str, team: str, players: []):
+        roster = self.teams[tournament][team]
+        kept = set(roster) & {playername for playername, _ in players}
+        for playername in roster:
+            if playername not in kept:
+                self.remove_player_from_tournament(playername, tournament)
+        # rebuilt in place, so the team keeps its place in self.teams. only new players go through add_player,
+        # which would list the tournament again for players already on the team
+        roster.clear()
+        for playername, playerscene in players:
+            if playername in kept:
+                roster.append(playername)
+                self.playerscenes[playername] = playerscene
+            else:
+                self.add_player(playername, playerscene, team, tournament)
+        self.rosters[self.team_ids[(tournament, team)]] = self.player_model.ids_for(roster)
+
+        affected = [i for i, m in enumerate(self.matches)
+                    if m['tournament'] == tournament and team in (m['team1name'], m['team2name'])]
+        if len(affected) > 0:
+            self.recalculate_from(affected[0])
+
+    def remove_player_from_tournament(self, playername: str, tournament: str):
+        del self.playerteams[playername][tournament]
+        self.playertournaments[playername].remove(tournament)
+        if len(self.playertournaments[playername]) == 0:
+            for player_dict in (self.playerteams, self.playertournaments, self.playerscenes):
+                player_dict.pop(playername, None)
+            self.player_model.remove(playername)
+
+    # include or exclude one tournament's group stage matches, and recalculate from its first changed match
+    def set_use_groups(self, tournament: str, use_groups: bool):
+        if use_groups:
+            moving = [m for m in self.excluded_matches if m['tournament'] == tournament]
+            self.excluded_matches = [m for m in self.excluded_matches if m['tournament'] != tournament]
+            if len(moving) == 0:
+                return
+            changed = len(self.matches)
+            for m in moving:
+                i = bisect.bisect_right([match['time'] for match in self.matches], m['time'])
+                self.matches.insert(i, m)
+                changed = min(changed, i)
+        else:
+            changed = None
+            kept = []
+            for i, m in enumerate(self.matches):
+                if m['tournament'] == tournament and m['bracket'] not in self.knockout_brackets:
+                    self.excluded_matches.append(m)
+                    if changed is None:
+                        changed = i
+                else:
+                    kept.append(m)
+            if changed is None:
+                return
+            self.matches = kept
+        self.recalculate_from(changed)
+
+    # live mode: rate one new match on top of the calculated history, without re-ingesting or re-sorting.
+    # matches must arrive in time order. an earlier match raises an Exception, unless allow_out_of_order,
+    # in which case it's inserted at its time, history is recalculated from there (see recalculate_from), and
+    # it's flagged in self.out_of_order_matches. either way rating history stays in time order. a match already
+    # ingested or added raises an Exception too, see duplicate_errors
+    # returns the new ratings of every player in the match, {playername: Rating}
+    def add_match(self, tournament: str, bracket: str, team1name: str, team2name: str,
+                  team1wins: int, team2wins: int, time: datetime.datetime, allow_out_of_order: bool = False,
+                  source: str = 'add_match'):
+        if self.rating_history is None:
+            raise Exception("add_match: calculate_trueskills must run before live matches are added")
+
+        errors = self.match_errors(tournament, team1name, team2name)
+        if errors == '':
+            errors = self.duplicate_errors(tournament, bracket, team1name, team2name, team1wins, team2wins, time,
+                                           source, index=False)
+        if errors != '':
+            raise Exception(errors)
 
-            # Prepare a list of RatingsUpdate to send to observers
-            all_updates = []
-            for i in range(len(self.teams[tournament][team1name])):
-                all_updates.append(RatingsUpdate(
-                    tournament=tournament,
-                    my_team_name=team1name,
-                    their_team_name=team2name,
-                    my_player_name=self.teams[tournament][team1name][i],
-                    my_old_rating=self.playerratings[self.teams[tournament][team1name][i]],
-                    my_new_rating=t1ratings[i],
-                    wins=team1wins,
-                    losses=team2wins))
-            for i in range(len(self.teams[tournament][team2name])):
-                all_updates.append(RatingsUpdate(
-                    tournament=tournament,
-                    my_team_name=team2name,
-                    their_team_name=team1name,
-                    my_player_name=self.teams[tournament][team2name][i],
-                    my_old_rating=self.playerratings[self.teams[tournament][team2name][i]],
-                    my_new_rating=t2ratings[i],
-                    wins=team2wins,
-                    losses=team1wins))
-
-            for update in all_updates:
-                for observer in self.observers:
-                    observer.observe(update)
+        match = {"tournament": tournament,
+                 "bracket": bracket,
+                 "team1name": team1name,
+                 "team2name": team2name,
+                 "team1wins": team1wins,
+                 "team2wins": team2wins,
+                 "time": time,
+                 }
+        out_of_order = len(self.matches) > 0 and time < self.matches[-1]["time"]
+        if out_of_order and not allow_out_of_order:
+            raise Exception(f"{tournament}.add_match: {team1name} vs {team2name} at {time} is earlier than "
+                            f"the last rated match at {self.matches[-1]['time']}")
+
+        if tournament not in self.tournamentdates.keys():
+            self.tournamentdates[tournament] = time.date()
+        self.duplicate_errors(tournament, bracket, team1name, team2name, team1wins, team2wins, time, source)
+
+        if out_of_order:
+            self.out_of_order_matches.append(match)
+            match_index = bisect.bisect_right([m['time'] for m in self.matches], time)
+            self.matches.insert(match_index, match)
+            self.recalculate_from(match_index)
+        else:
+            self.matches.append(match)
+            self.rate_match(len(self.matches) - 1, match)
+            self.instrumentation.tournament(None)
+            self.record_trueskill_snapshot(tournament)
 
-            # now put the ratings back into the main dict
-            for i in range(len(self.teams[tournament][team1name])):
-                self.playerratings[self.teams[tournament][team1name][i]] = t1ratings[i]
-            for i in range(len(self.teams[tournament][team2name])):
-                self.playerratings[self.teams[tournament][team2name][i]] = t2ratings[i]
-        self.record_trueskill_snapshot(current_tournament)
+        new_ratings = {}
+        for player in self.teams[tournament][team1name] + self.teams[tournament][team2name]:
+            new_ratings[player] = self.playerratings[player]
+        return new_ratings
 
 
     def compare_ratings(self, old_playerratings, playerratings):
@@ -267,33 +1118,23 @@ class KQTrueSkill:
         print(f"Changed players: {shared_player_deltas}")
 
     def ingest_players_from_file(self, filename: str):
-        with open(filename) as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=',')
-            line_count = 0
-            last_seen_team = None
-            for row in csv_reader:
-                if line_count == 0:
-                    print(f'Player List Column names are {", ".join(row)}')
-                    line_count += 1
-                else:
-                    line_count += 1
-                    tournament = row[0]
-                    playerteam = row[1]
-                    playername = row[2]
-                    playerscene = row[3]
-
-                    if playerteam is None or playerteam.strip() == '':
-                        playerteam = last_seen_team
-                    else:
-                        last_seen_team = playerteam
-                    self.add_player(playername, playerscene, playerteam, tournament)
-            print(f'Processed {line_count} players from {filename}.')
-            # print(f'Player Scenes: {self.playerscenes}')
-            # print(f'****TEAMS: {self.teams}')
-
-    def add_player(self, playername, playerscene, playerteam, tournament):
+        header, rows = read_player_file(filename)
+        self.ingest_player_rows(header, rows, filename)
+
+    # rows are [tournament, team, player, scene]. a blank team means the previous row's team
+    def ingest_player_rows(self, header: [], rows: [], filename: str):
+        print(f'Player List Column names are {", ".join(header)}')
+        for tournament, playerteam, playername, playerscene in fill_blank_teams(rows):
+            self.add_player(playername, playerscene, playerteam, tournament)
+        print(f'Processed {len(rows) + 1} players from {filename}.')
+        # print(f'Player Scenes: {self.playerscenes}')
+        # print(f'****TEAMS: {self.teams}')
+
+    # build_roster=False leaves the team's roster ids to a build_roster call once the whole team is in
+    def add_player(self, playername, playerscene, playerteam, tournament, build_roster: bool = True):
         if tournament not in self.tournaments:
             self.tournaments.append(tournament)
+            self.tournament_ids[tournament] = len(self.tournament_ids)
             self.teams[tournament] = {}
             self.incomplete_teams[tournament] = []
 
@@ -336,78 +1177,134 @@ class KQTrueSkill:
         #                     f'But {self.displayname_map.get(playername, displayname)} already present')
         # self.displayname_map[playername] = displayname
 
-        self.playergames[playername] = 0
-        self.playerwins[playername] = 0
-        self.playerlosses[playername] = 0
+        # new players start with a new rating. in live mode, after ratings are calculated, they need a
+        # starting point in the snapshots too
+        if playername not in self.playerratings:
+            self.player_model.add(playername)
+            if self.rating_history is not None:
+                self.snapshots.add_player(playername, self.playerratings[playername])
+
+        if build_roster:
+            self.build_roster(tournament, playerteam)
 
         # elif playerscene is None or playerscene.strip() == '':
         #     self.incomplete_players.append(f"{tournament}: {playerteam}, {playername}, {playerscene}")
 
+    # the player ids of a team, for rating its matches
+    def build_roster(self, tournament: str, team: str):
+        if (tournament, team) not in self.team_ids:
+            self.team_ids[(tournament, team)] = len(self.rosters)
+            self.rosters.append(None)
+        self.rosters[self.team_ids[(tournament, team)]] = self.player_model.ids_for(self.teams[tournament][team])
+
     # side effect: updates tournament dates with dates found here
     def ingest_matches_from_file(self, filename: str, use_groups :bool = True):
-        with open(filename) as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=',')
-            line_count = 0
-            errors = ''
-            for row in csv_reader:
-                if line_count == 0:
-                    # print(f' Game Results Column names are {", ".join(row)}')
-                    line_count += 1
-                else:
-                    # print(f'\t{row[0]}, {row[1]}, {row[2]}, {row[3]}, {row[4]}, {row[5]}, {row[6]}.')
-                    tournament = row[0]
-                    bracket = row[1]
-                    team1name = row[2]
-                    team2name = row[3]
-                    team1wins = int(row[4])
-                    team2wins = int(row[5])
-                    time = datetime.datetime.strptime(row[6], self.datetime_format)
-
-                    # we should not be adding any new members to our tourney/team lists here
-                    if tournament not in self.tournaments:
-                        errors += f"{tournament} not found in self.tournaments. tournaments found = {self.tournaments}\n"
-                    if team1name not in self.teams[tournament].keys():
-                        errors += f"{team1name} not found in teams[{tournament}]. team 2 was {team2name}. teams found = {self.teams[tournament].keys()}\n"
-                    if team2name not in self.teams[tournament].keys():
-                        errors += f"{team2name} not found in teams[{tournament}]. team 1 was {team1name}. teams found = {self.teams[tournament].keys()}\n"
-
-                    # track the date for this tournament, if not already tracked
-                    if tournament not in self.tournamentdates.keys():
-                        self.tournamentdates[tournament] = time.date()
-                        print(f"sat {tournament} date to {time.strftime(KQTrueSkill.datetime_format)}")
-
-                    # output what brackets are included for visual testing
-                    brackets_excluded = []
-                    brackets_included = []
-                    if use_groups:
-                        self.matches.append(
-                            {"tournament": tournament,
-                             "bracket": bracket,
-                             "team1name": team1name,
-                             "team2name": team2name,
-                             "team1wins": team1wins,
-                             "team2wins": team2wins,
-                             "time": time,
-                             })
-                    else:
-                        if bracket in {"KO","Knockout","WC","Wildcard"}:
-                            self.matches.append(
-                                {"tournament": tournament,
-                                 "bracket": bracket,
-                                 "team1name": team1name,
-                                 "team2name": team2name,
-                                 "team1wins": team1wins,
-                                 "team2wins": team2wins,
-                                 "time": time,
-                                 })
-                        else:
-                            # brackets_excluded.append(tournament+"/"+bracket)
-                            print(f"use_groups is {use_groups}: Excluded {tournament}/{bracket}")
-                    line_count += 1
-        print(f"Processed {line_count - 1} matches, now tracking {len(self.matches)} matches.")
+        _, rows = read_match_file(filename, self.datetime_format)
+        errors = self.ingest_match_rows(rows, use_groups, filename)
+        print(f"Processed {len(rows)} matches, now tracking {len(self.matches)} matches.")
         if errors != '':
             raise Exception(errors)
 
+    # rows are [tournament, bracket, team1name, team2name, team1wins, team2wins, time], source the file they
+    # came from. returns every row's validation errors, for the caller to raise once the whole file has been read
+    def ingest_match_rows(self, rows: [], use_groups: bool = True, source: str = None) -> str:
+        errors = ''
+        for tournament, bracket, team1name, team2name, team1wins, team2wins, time in rows:
+            errors += self.ingest_match(tournament, bracket, team1name, team2name, team1wins, team2wins,
+                                        time, use_groups, source)
+        return errors
+
+    # add one parsed row of a match results file. returns any validation errors, for the caller to raise
+    # once the whole file has been read
+    def ingest_match(self, tournament: str, bracket: str, team1name: str, team2name: str,
+                     team1wins: int, team2wins: int, time: datetime.datetime, use_groups: bool = True,
+                     source: str = None) -> str:
+        # we should not be adding any new members to our tourney/team lists here
+        errors = self.match_errors(tournament, team1name, team2name)
+        errors += self.duplicate_errors(tournament, bracket, team1name, team2name, team1wins, team2wins, time,
+                                        source)
+
+        # track the date for this tournament, if not already tracked
+        if tournament not in self.tournamentdates.keys():
+            self.tournamentdates[tournament] = time.date()
+            print(f"sat {tournament} date to {time.strftime(KQTrueSkill.datetime_format)}")
+
+        # output what brackets are included for visual testing
+        brackets_excluded = []
+        brackets_included = []
+        match = {"tournament": tournament,
+                 "bracket": bracket,
+                 "team1name": team1name,
+                 "team2name": team2name,
+                 "team1wins": team1wins,
+                 "team2wins": team2wins,
+                 "time": time,
+                 }
+        if use_groups:
+            self.matches.append(match)
+        else:
+            if bracket in self.knockout_brackets:
+                self.matches.append(match)
+            else:
+                # brackets_excluded.append(tournament+"/"+bracket)
+                # kept so set_use_groups can bring them back
+                self.excluded_matches.append(match)
+                print(f"use_groups is {use_groups}: Excluded {tournament}/{bracket}")
+        return errors
+
+    # check a row against every row ingested so far, and index it. the same result for the same pairing in the
+    # same bracket at the same time is a duplicate, wherever it came from. a different result from another
+    # file is a conflict. a different result within one file is a rematch, eg a grand final reset: scrubbed
+    # files often give a whole bracket one time. returns '' if the row is new. index=False only checks
+    def duplicate_errors(self, tournament: str, bracket: str, team1name: str, team2name: str,
+                         team1wins: int, team2wins: int, time: datetime.datetime, source: str = None,
+                         index: bool = True) -> str:
+        # the team pair & result in name order, so the same match reported either way round has the same key
+        if team2name < team1name:
+            team1name, team2name, team1wins, team2wins = team2name, team1name, team2wins, team1wins
+        key = (tournament, bracket, team1name, team2name, time)
+        reports = self.ingested_rows.setdefault(key, []) if index else self.ingested_rows.get(key, [])
+        errors = ''
+        for other_source, other_result in reports:
+            if other_result == (team1wins, team2wins):
+                errors += f"{tournament}/{bracket}: {team1name} vs {team2name} {team1wins}-{team2wins} at {time} " \
+                          f"duplicates a match from {other_source}\n"
+                break
+            if other_source != source:
+                errors += f"{tournament}/{bracket}: {team1name} vs {team2name} {team1wins}-{team2wins} at {time} " \
+                          f"conflicts with {other_result[0]}-{other_result[1]} from {other_source}\n"
+                break
+        if index:
+            reports.append((source, (team1wins, team2wins)))
+        return errors
+
+    # take a match's row back out of ingested_rows. returns the source it came from
+    def forget_ingested_row(self, match: {}) -> str:
+        tournament, bracket, team1name, team2name, team1wins, team2wins, time = match_row(match)
+        if team2name < team1name:
+            team1name, team2name, team1wins, team2wins = team2name, team1name, team2wins, team1wins
+        key = (tournament, bracket, team1name, team2name, time)
+        reports = self.ingested_rows.get(key, [])
+        for i in reversed(range(len(reports))):
+            if reports[i][1] == (team1wins, team2wins):
+                source = reports.pop(i)[0]
+                if not reports:
+                    del self.ingested_rows[key]
+                return source
+        return None
+
+    # validate a match against the known tournaments & teams. returns '' if the match is good
+    def match_errors(self, tournament: str, team1name: str, team2name: str) -> str:
+        errors = ''
+        if tournament not in self.tournaments:
+            errors += f"{tournament} not found in self.tournaments. tournaments found = {self.tournaments}\n"
+        if team1name not in self.teams[tournament].keys():
+            errors += f"{team1name} not found in teams[{tournament}]. team 2 was {team2name}. teams found = {self.teams[tournament].keys()}\n"
+        if team2name not in self.teams[tournament].keys():
+            errors += f"{team2name} not found in teams[{tournament}]. team 1 was {team1name}. teams found = {self.teams[tournament].keys()}\n"
+        return errors
+
+    @instrumented('export')
     def write_player_ratings(self, filename: str = None):
         if filename is None:
             filename = self.output_file_name
@@ -470,6 +1367,71 @@ class KQTrueSkill:
         denom = math.sqrt(size * (ts.beta ** 2) + sum_sigma)
         return ts.cdf(delta_mu / denom)
 
+    # ratings for a tournament team as they'd be rated right now, padded with bots to 5 players
+    def team_ratings(self, tournament: str, team: str):
+        ratings = [self.playerratings[player] for player in self.teams[tournament][team]]
+        for _ in range(len(ratings), 5):
+            ratings.append(self.create_bot())
+        return ratings
+
+    # win probability for team1 in a game against team2, using current ratings
+    def win_probability_match(self, tournament: str, team1name: str, team2name: str):
+        return self.win_probability_teams(self.team_ratings(tournament, team1name),
+                                          self.team_ratings(tournament, team2name))
+
+    # teams as a (teams, players) array of player ids, -1 for empty slots after a team's last player.
+    # teams is a list of teams, each a list of playernames or player ids, or already an id array
+    def team_id_array(self, teams) -> np.ndarray:
+        if isinstance(teams, np.ndarray):
+            return teams
+        ids = np.full((len(teams), max([5] + [len(team) for team in teams])), -1, dtype=np.int64)
+        for i, team in enumerate(teams):
+            ids[i, :len(team)] = [self.player_model.id(p) if isinstance(p, str) else p for p in team]
+        return ids
+
+    # (sum of mu, sum of sigma^2, players) per team, using current ratings padded with bots to 5 players
+    # like team_ratings. sums are taken in team order, bots last, so they agree exactly with win_probability_teams
+    def team_rating_sums(self, teams):
+        ids = self.team_id_array(teams)
+        width = max(5, ids.shape[1])
+        present = np.zeros((len(ids), width), dtype=bool)
+        present[:, :ids.shape[1]] = ids >= 0
+        players = present.sum(axis=1)
+        bots = ~present & (np.arange(width) < 5)
+
+        bot = self.create_bot()
+        mu = np.zeros((len(ids), width))
+        var = np.zeros((len(ids), width))
+        mu[:, :ids.shape[1]] = np.where(ids >= 0, self.player_model.mu[ids], 0.)
+        var[:, :ids.shape[1]] = np.where(ids >= 0, self.player_model.sigma[ids] ** 2, 0.)
+        mu[bots] = bot.mu
+        var[bots] = bot.sigma ** 2
+        return mu.sum(axis=1), var.sum(axis=1), np.maximum(players, 5)
+
+    # win probability for team1s[i] in a game against team2s[i], for every i. teams as for team_id_array
+    def win_probabilities(self, team1s, team2s) -> np.ndarray:
+        mu1, var1, size1 = self.team_rating_sums(team1s)
+        mu2, var2, size2 = self.team_rating_sums(team2s)
+        ts: trueskill = trueskill.global_env()
+        return cdf((mu1 - mu2) / np.sqrt((size1 + size2) * (ts.beta ** 2) + (var1 + var2)))
+
+    # matrix[i, j] = win probability for teams[i] in a game against teams[j]. teams as for team_id_array
+    def win_probability_matrix(self, teams) -> np.ndarray:
+        mu, var, size = self.team_rating_sums(teams)
+        ts: trueskill = trueskill.global_env()
+        return cdf((mu[:, np.newaxis] - mu[np.newaxis, :]) /
+                   np.sqrt((size[:, np.newaxis] + size[np.newaxis, :]) * (ts.beta ** 2) +
+                           (var[:, np.newaxis] + var[np.newaxis, :])))
+
+    # matrix[i, j] = trueskill.quality of a game between teams[i] & teams[j], the chance of a draw relative to
+    # an evenly matched game. teams as for team_id_array
+    def match_quality_matrix(self, teams) -> np.ndarray:
+        mu, var, size = self.team_rating_sums(teams)
+        ts: trueskill = trueskill.global_env()
+        skill_var = (size[:, np.newaxis] + size[np.newaxis, :]) * (ts.beta ** 2)
+        denom = skill_var + (var[:, np.newaxis] + var[np.newaxis, :])
+        return np.sqrt(skill_var / denom) * np.exp(-(mu[:, np.newaxis] - mu[np.newaxis, :]) ** 2 / (2 * denom))
+
     def get_player_scene_list(self):
         playerlist = []
 
@@ -501,11 +1463,21 @@ class KQTrueSkill:
                     output += f"{team}, "
                 print(output)
 
+    # only the ratings that changed since the last snapshot are stored
+    @instrumented('snapshot')
     def record_trueskill_snapshot(self, tournament):
-        self.snapshots[tournament] = copy.deepcopy(self.playerratings)
+        self.snapshots.record(tournament, {self.player_model.names[player_id]: self.player_model.rating(player_id)
+                                           for player_id in self.unsnapshotted_players})
+        self.unsnapshotted_players = set()
 
     def create_bot(self):
-        return Rating(mu=5.000, sigma=2)
+        return Rating(mu=self.bot_mu, sigma=self.bot_sigma)
+
+    # mu & sigma arrays for a team, with bots added to make 5 players if there are fewer
+    def pad_with_bots(self, mu, sigma):
+        bot = self.create_bot()
+        bots = max(0, 5 - len(mu))
+        return np.concatenate((mu, np.full(bots, bot.mu))), np.concatenate((sigma, np.full(bots, bot.sigma)))
 
 
 def render_player_match_stats(match_stats: Dict[str, AggregatedMatchStats],
@@ -587,7 +1559,9 @@ def render_player_summary(player_name, history):
 
 
 def main():
-    history: KQTrueSkill = KQTrueSkill()
+    # where the time goes, see instrumentation.py
+    instrumentation = Instrumentation(enabled=True)
+    history: KQTrueSkill = KQTrueSkill(instrumentation=instrumentation)
 
     # stuff to copy into README
     history.print_known_tournaments()
@@ -597,6 +1571,10 @@ def main():
     # print your player ratings
     history.write_player_ratings()
 
+    # how well the ratings going into each match predicted it
+    print(history.predictions.report())
+    print(instrumentation.format_report())
+
     print(f"win probablity, 5 Dans vs 5 Wilks {history.win_probability_players('Dan Shupp', 'Andrew Wilkening')}")
 
     ni_howdy = [history.snapshots['BB4']['Woody Stanfield'],
@@ -0,0 +1,177 @@
+import csv
+import datetime
+
+import numpy as np
+
+# bump whenever the arrays stored in a binary dataset change
+BINARY_FORMAT_VERSION: int = 1
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class StringTable:
+    '''Interns strings, handing out a dense integer id for each distinct string in order of first appearance.'''
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def intern(self, s: str) -> int:
+        if s not in self.ids:
+            self.ids[s] = len(self.strings)
+            self.strings.append(s)
+        return self.ids[s]
+
+    def to_array(self) -> np.ndarray:
+        return np.array(self.strings, dtype=np.str_)
+
+
+# convert a player file & match results file pair into one binary dataset (a .npz file of plain arrays).
+# both csv files keep the quirks ingest_players_from_file & ingest_matches_from_file expect: the first row is
+# always a header, and a blank team in the player file means the previous row's team
+def convert_dataset(playerfile: str, matchfile: str, filename: str,
+                    datetime_format: str = "%Y-%m-%dT%H:%M:%S%z"):
+    tournaments = StringTable()
+    brackets = StringTable()
+    teams = StringTable()
+    players = StringTable()
+    scenes = StringTable()
+
+    with open(playerfile) as csv_file:
+        rows = list(csv.reader(csv_file, delimiter=','))
+    player_header = rows[0]
+    player_rows = rows[1:]
+    player_columns = np.array([[tournaments.intern(row[0]),
+                                teams.intern(row[1]),
+                                players.intern(row[2]),
+                                scenes.intern(row[3])] for row in player_rows], dtype=np.int32).reshape(-1, 4)
+
+    with open(matchfile) as csv_file:
+        rows = list(csv.reader(csv_file, delimiter=','))
+    match_header = rows[0]
+    match_rows = rows[1:]
+    match_columns = np.array([[tournaments.intern(row[0]),
+                               brackets.intern(row[1]),
+                               teams.intern(row[2]),
+                               teams.intern(row[3]),
+                               int(row[4]),
+                               int(row[5])] for row in match_rows], dtype=np.int32).reshape(-1, 6)
+
+    # times are stored as microseconds since the epoch plus the utc offset they were written with,
+    # so the loaded datetimes compare, print & convert to dates exactly like the parsed strings
+    match_microseconds = np.zeros(len(match_rows), dtype=np.int64)
+    match_utcoffsets = np.zeros(len(match_rows), dtype=np.int32)
+    for i, row in enumerate(match_rows):
+        time = datetime.datetime.strptime(row[6], datetime_format)
+        match_microseconds[i] = (time - EPOCH) // datetime.timedelta(microseconds=1)
+        match_utcoffsets[i] = int(time.utcoffset().total_seconds())
+
+    np.savez(filename,
+             version=np.array([BINARY_FORMAT_VERSION]),
+             player_header=np.array(player_header, dtype=np.str_),
+             match_header=np.array(match_header, dtype=np.str_),
+             tournaments=tournaments.to_array(),
+             brackets=brackets.to_array(),
+             teams=teams.to_array(),
+             players=players.to_array(),
+             scenes=scenes.to_array(),
+             player_columns=player_columns,
+             match_columns=match_columns,
+             match_microseconds=match_microseconds,
+             match_utcoffsets=match_utcoffsets)
+    print(f"Converted {playerfile} ({len(player_rows)} players) & {matchfile} ({len(match_rows)} matches) "
+          f"to {filename}")
+
+
+class BinaryDataset:
+    '''A dataset written by convert_dataset: interned string tables plus one row of integer ids per player
+    and per match, in the same order as the csv files they came from.'''
+
+    def __init__(self, filename: str):
+        with np.load(filename) as data:
+            version = int(data['version'][0])
+            if version != BINARY_FORMAT_VERSION:
+                raise Exception(f"{filename} is binary dataset version {version}, expected {BINARY_FORMAT_VERSION}")
+            self.player_header: [] = data['player_header'].tolist()
+            self.match_header: [] = data['match_header'].tolist()
+            self.tournaments: [] = data['tournaments'].tolist()
+            self.brackets: [] = data['brackets'].tolist()
+            self.teams: [] = data['teams'].tolist()
+            self.players: [] = data['players'].tolist()
+            self.scenes: [] = data['scenes'].tolist()
+            self.player_columns: np.ndarray = data['player_columns']
+            self.match_columns: np.ndarray = data['match_columns']
+            self.match_microseconds: np.ndarray = data['match_microseconds']
+            self.match_utcoffsets: np.ndarray = data['match_utcoffsets']
+
+    # [tournament, team, player, scene] per row, exactly as found in the player file
+    def player_rows(self) -> []:
+        return [[self.tournaments[t], self.teams[team], self.players[p], self.scenes[s]]
+                for t, team, p, s in self.player_columns.tolist()]
+
+    # the team id of each player row, with a blank team carried forward from the row before like
+    # ingest_player_rows does. -1 for blank teams before the first named one
+    def player_team_ids(self) -> np.ndarray:
+        team_ids = self.player_columns[:, 1]
+        blank = np.array([team.strip() == '' for team in self.teams], dtype=bool)
+        named_rows = np.where(blank[team_ids], -1, np.arange(len(team_ids))) if len(team_ids) else team_ids
+        last_named = np.maximum.accumulate(named_rows) if len(team_ids) else named_rows
+        return np.where(last_named >= 0, team_ids[np.maximum(last_named, 0)], -1)
+
+    # match times as datetimes with their original utc offsets. the local times are converted in one go by
+    # numpy, so each row only costs attaching its timezone
+    def match_times(self) -> []:
+        offsets = self.match_utcoffsets
+        local = (self.match_microseconds + offsets.astype(np.int64) * 1000000).astype('datetime64[us]').tolist()
+        timezones = {offset: datetime.timezone(datetime.timedelta(seconds=offset)) for offset in set(offsets.tolist())}
+        return [time.replace(tzinfo=timezones[offset]) for time, offset in zip(local, offsets.tolist())]
+
+    # [tournament, bracket, team1name, team2name, team1wins, team2wins, time] per row
+    def match_rows(self) -> []:
+        return [[self.tournaments[t], self.brackets[b], self.teams[team1], self.teams[team2], team1wins, team2wins,
+                 time]
+                for (t, b, team1, team2, team1wins, team2wins), time in zip(self.match_columns.tolist(),
+                                                                            self.match_times())]
+
+    # write the dataset back out as a player file & match results file
+    def write_csv(self, playerfile: str, matchfile: str, datetime_format: str = "%Y-%m-%dT%H:%M:%S%z"):
+        with open(playerfile, mode='w') as csv_file:
+            writer = csv.writer(csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(self.player_header)
+            writer.writerows(self.player_rows())
+        with open(matchfile, mode='w') as csv_file:
+            writer = csv.writer(csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(self.match_header)
+            for row in self.match_rows():
+                writer.writerow(row[:6] + [row[6].strftime(datetime_format)])
+
+
+def binary_dataset_filename(matchfile: str) -> str:
+    return matchfile[:-len('.csv')] + '.npz'
+
+
+# convert the approved datasets, and check each one reads back the same as its csv files
+def main():
+    from KQTrueSkill import KQTrueSkill
+
+    for playerfile, matchfile in KQTrueSkill.approved_datasets:
+        filename = binary_dataset_filename(matchfile)
+        convert_dataset(playerfile, matchfile, filename, KQTrueSkill.datetime_format)
+
+        dataset = BinaryDataset(filename)
+        with open(playerfile) as csv_file:
+            if [row[:4] for row in list(csv.reader(csv_file))[1:]] != dataset.player_rows():
+                raise Exception(f"{filename} players don't match {playerfile}")
+        with open(matchfile) as csv_file:
+            rows = list(csv.reader(csv_file))[1:]
+        for row, binary_row in zip(rows, dataset.match_rows()):
+            time = datetime.datetime.strptime(row[6], KQTrueSkill.datetime_format)
+            if (row[:4] + [int(row[4]), int(row[5]), time] != binary_row
+                    or time.utcoffset() != binary_row[6].utcoffset()):
+                raise Exception(f"{filename} match {binary_row} doesn't match {matchfile} row {row}")
+        if len(rows) != len(dataset.match_columns):
+            raise Exception(f"{filename} has {len(dataset.match_columns)} matches, {matchfile} has {len(rows)}")
+
+
+if __name__ == '__main__':
+    main()
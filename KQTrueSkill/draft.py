@@ -0,0 +1,260 @@
+import math
+import random
+import time
+
+import numpy as np
+import trueskill
+
+
+class DraftResult:
+    '''Teams from a DraftOptimizer run, strongest first. strengths[i] is teams[i]'s summed mu, bot included,
+    spread is the strongest minus the weakest, and quality is trueskill match quality averaged over every
+    pair of teams.'''
+
+    def __init__(self, teams: [], strengths: [], spread: float, quality: float):
+        self.teams = teams
+        self.strengths = strengths
+        self.spread = spread
+        self.quality = quality
+
+    def __repr__(self):
+        return f"DraftResult({len(self.teams)} teams, spread={self.spread:.2f}, quality={self.quality:.4f})"
+
+
+class DraftOptimizer:
+    '''Splits a pool of players into teams of 5 for a draft tournament, by simulated annealing over swaps
+    between teams, within a time budget. Ratings come from history.playerratings; players without a rating
+    yet draft at the initial rating. If the pool doesn't divide by 5, the players are spread as evenly as
+    possible, the first few teams taking one more than the rest, and every team short of 5 is padded with bots
+    like win_probability_teams.
+
+    objective is 'spread', to make team mu sums as even as possible (least squared distance from the mean),
+    or 'quality', to maximise trueskill match quality averaged over every pair of teams. A swap only changes
+    the sums of the two teams involved, so scoring a move costs O(1) for spread and O(teams) for quality.
+
+    together is a list of groups of playernames who must be on the same team. queens is the players who can
+    play queen; if given, every team gets at least one.'''
+
+    def __init__(self, history, players: [], objective: str = 'spread', together: [] = (), queens: [] = None,
+                 seed: int = None):
+        if objective not in ('spread', 'quality'):
+            raise Exception(f"DraftOptimizer: unknown objective {objective}")
+        if len(set(players)) != len(players):
+            raise Exception("DraftOptimizer: players are listed more than once")
+        self.players = list(players)
+        self.objective = objective
+        self.rng = random.Random(seed)
+
+        ratings = [history.playerratings[p] if p in history.playerratings else history.player_model.initial_rating()
+                   for p in self.players]
+        bot = history.create_bot()
+        self.bot_mu = bot.mu
+        self.bot_var = bot.sigma ** 2
+        self.beta2 = trueskill.global_env().beta ** 2
+
+        self.teams = max(1, math.ceil(len(self.players) / 5))
+        # as even as possible: the first few teams take one player more when the pool doesn't divide evenly.
+        # _team_sums makes up each team's shortfall from 5 with bots
+        base, extra = divmod(len(self.players), self.teams)
+        self.capacity = [base + 1 if t < extra else base for t in range(self.teams)]
+
+        # units are the groups that move between teams together; everyone not in a together group is on their own
+        self.units = self._units(together)
+        self.unit_mu = [sum(ratings[p].mu for p in unit) for unit in self.units]
+        self.unit_var = [sum(ratings[p].sigma ** 2 for p in unit) for unit in self.units]
+        queens = set() if queens is None else set(queens)
+        self.require_queens = len(queens) > 0
+        self.unit_queens = [sum(self.players[p] in queens for p in unit) for unit in self.units]
+        if self.require_queens and sum(self.unit_queens) < self.teams:
+            raise Exception(f"DraftOptimizer: {sum(self.unit_queens)} queens in the pool for {self.teams} teams")
+
+        self.unit_team = self._initial_assignment()
+
+    def _units(self, together: []) -> []:
+        index = {player: i for i, player in enumerate(self.players)}
+        parent = list(range(len(self.players)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for group in together:
+            for player in group:
+                if player not in index:
+                    raise Exception(f"DraftOptimizer: {player} is in a together group but not in the pool")
+            for player in group[1:]:
+                parent[find(index[player])] = find(index[group[0]])
+
+        units = {}
+        for i in range(len(self.players)):
+            units.setdefault(find(i), []).append(i)
+        units = list(units.values())
+        for unit in units:
+            if len(unit) > 5:
+                raise Exception(f"DraftOptimizer: {[self.players[p] for p in unit]} can't all be on one team")
+        return units
+
+    # queen units first, one per team while they last, then everything else biggest first into the emptiest team
+    def _initial_assignment(self) -> []:
+        unit_team = [-1] * len(self.units)
+        room = list(self.capacity)
+        queens = [0] * self.teams
+        order = sorted(range(len(self.units)), key=lambda u: (self.unit_queens[u] == 0, -len(self.units[u])))
+        for u in order:
+            fits = [t for t in range(self.teams) if room[t] >= len(self.units[u])]
+            if not fits:
+                raise Exception("DraftOptimizer: the together groups don't fit into teams of 5")
+            if self.unit_queens[u] > 0:
+                t = min(fits, key=lambda t: (queens[t], -room[t]))
+            else:
+                t = max(fits, key=lambda t: room[t])
+            unit_team[u] = t
+            room[t] -= len(self.units[u])
+            queens[t] += self.unit_queens[u]
+        return unit_team
+
+    def _team_sums(self, unit_team: []):
+        mu = np.array([(5 - capacity) * self.bot_mu for capacity in self.capacity])
+        var = np.array([(5 - capacity) * self.bot_var for capacity in self.capacity])
+        queens = [0] * self.teams
+        for u, t in enumerate(unit_team):
+            mu[t] += self.unit_mu[u]
+            var[t] += self.unit_var[u]
+            queens[t] += self.unit_queens[u]
+        return mu, var, queens
+
+    # quality[j] of team (mu, var) against each of the teams (mus, vars), every team being 5 players
+    def _quality(self, mu, var, mus, vars):
+        denom = 10 * self.beta2 + var + vars
+        return np.sqrt(10 * self.beta2 / denom) * np.exp(-(mu - mus) ** 2 / (2 * denom))
+
+    def _quality_matrix(self, mu, var):
+        quality = self._quality(mu[:, np.newaxis], var[:, np.newaxis], mu[np.newaxis, :], var[np.newaxis, :])
+        np.fill_diagonal(quality, 0.)
+        return quality
+
+    # a random swap: a unit for a unit of the same size, or for as many players on their own, on another team.
+    # returns (unit, others) or None
+    def _random_move(self, unit_team: [], team_units: []):
+        u = self.rng.randrange(len(self.units))
+        b = self.rng.randrange(self.teams - 1)
+        if b >= unit_team[u]:
+            b += 1
+        size = len(self.units[u])
+        same_size = [v for v in team_units[b] if len(self.units[v]) == size]
+        if size == 1:
+            return (u, [self.rng.choice(same_size)]) if same_size else None
+        singles = [v for v in team_units[b] if len(self.units[v]) == 1]
+        if same_size and (len(singles) < size or self.rng.random() < 0.5):
+            return u, [self.rng.choice(same_size)]
+        if len(singles) >= size:
+            return u, self.rng.sample(singles, size)
+        return None
+
+    # (queen penalty change, objective change, team a mu change, team a var change, new quality rows of a & b)
+    # for a move; changes are lower is better. team b's sums change by the opposite of team a's
+    def _score_move(self, unit_team: [], u, others, mu, var, queens, quality):
+        a = unit_team[u]
+        b = unit_team[others[0]]
+        d_mu = sum(self.unit_mu[v] for v in others) - self.unit_mu[u]
+        d_var = sum(self.unit_var[v] for v in others) - self.unit_var[u]
+        d_queens = sum(self.unit_queens[v] for v in others) - self.unit_queens[u]
+
+        penalty = 0
+        if self.require_queens:
+            penalty = (((queens[a] + d_queens) == 0) - (queens[a] == 0) +
+                       ((queens[b] - d_queens) == 0) - (queens[b] == 0))
+
+        if self.objective == 'spread':
+            # sum of squares about a mean that swaps don't move
+            return penalty, 2 * d_mu * (mu[a] - mu[b]) + 2 * d_mu ** 2, d_mu, d_var, None
+
+        mus = mu.copy()
+        vars = var.copy()
+        mus[a] += d_mu
+        vars[a] += d_var
+        mus[b] -= d_mu
+        vars[b] -= d_var
+        rows = self._quality(mus[[a, b], np.newaxis], vars[[a, b], np.newaxis], mus, vars)
+        rows[0, a] = 0.
+        rows[1, b] = 0.
+        old = quality[a].sum() + quality[b].sum() - quality[a, b]
+        new = rows[0].sum() + rows[1].sum() - rows[0, b]
+        return penalty, old - new, d_mu, d_var, rows
+
+    # search for up to seconds, returning the best draft found
+    def run(self, seconds: float = 2.0) -> DraftResult:
+        unit_team = list(self.unit_team)
+        team_units = [[] for _ in range(self.teams)]
+        for u, t in enumerate(unit_team):
+            team_units[t].append(u)
+        mu, var, queens = self._team_sums(unit_team)
+        quality = self._quality_matrix(mu, var) if self.objective == 'quality' else None
+
+        penalty = queens.count(0) if self.require_queens else 0
+        score = 0.
+        best = (penalty, score, list(unit_team))
+        if self.teams > 1:
+            # start hot enough to accept a typical bad move about a third of the time, and cool to near zero
+            samples = [self._random_move(unit_team, team_units) for _ in range(200)]
+            deltas = [abs(self._score_move(unit_team, *move, mu, var, queens, quality)[1]) for move in samples if move]
+            start_temperature = max(np.mean(deltas) if deltas else 0., 1e-9)
+
+            start = time.perf_counter()
+            moves = 0
+            temperature = start_temperature
+            while True:
+                if moves % 256 == 0:
+                    progress = (time.perf_counter() - start) / seconds
+                    if progress >= 1:
+                        break
+                    temperature = start_temperature * 0.001 ** progress
+                moves += 1
+                move = self._random_move(unit_team, team_units)
+                if move is None:
+                    continue
+                u, others = move
+                d_penalty, d_score, d_mu, d_var, rows = self._score_move(unit_team, u, others, mu, var, queens, quality)
+                if d_penalty > 0:
+                    continue
+                if d_penalty == 0 and d_score > 0 and self.rng.random() >= math.exp(-d_score / temperature):
+                    continue
+
+                a = unit_team[u]
+                b = unit_team[others[0]]
+                for v in others:
+                    unit_team[v] = a
+                    team_units[b].remove(v)
+                    team_units[a].append(v)
+                unit_team[u] = b
+                team_units[a].remove(u)
+                team_units[b].append(u)
+                d_queens = sum(self.unit_queens[v] for v in others) - self.unit_queens[u]
+                mu[a] += d_mu
+                var[a] += d_var
+                queens[a] += d_queens
+                mu[b] -= d_mu
+                var[b] -= d_var
+                queens[b] -= d_queens
+                if rows is not None:
+                    quality[[a, b], :] = rows
+                    quality[:, [a, b]] = rows.T
+                penalty += d_penalty
+                score += d_score
+                if (penalty, score) < best[:2]:
+                    best = (penalty, score, list(unit_team))
+
+        return self._result(best[2])
+
+    def _result(self, unit_team: []) -> DraftResult:
+        mu, var, _ = self._team_sums(unit_team)
+        teams = [[] for _ in range(self.teams)]
+        for u, t in enumerate(unit_team):
+            teams[t].extend(self.players[p] for p in self.units[u])
+        quality = self._quality_matrix(mu, var)
+        pairs = self.teams * (self.teams - 1)
+        order = np.argsort(-mu, kind='stable')
+        return DraftResult([teams[t] for t in order], [float(mu[t]) for t in order],
+                           float(mu.max() - mu.min()), float(quality.sum() / pairs) if pairs else 1.)
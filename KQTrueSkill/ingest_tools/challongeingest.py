@@ -3,27 +3,31 @@ import datetime
 import configparser
 import requests
 import json
-import challonge
+import os
 
-from KQTrueSkill.KQtrueskill import KQTrueSkill
+from concurrentingest import ChallongeClient, MATCHFILE_DATETIME_FORMAT
+from responsecache import ResponseCache
 
 
 class ChallongeAccount:
     DATETIME_FORMAT: str = "%Y-%m-%dT%H:%M:%S.%f%z"
     API_URL: str = "https://api.challonge.com/v1/"
 
-    def __init__(self, api_key: str, subdomain: str):
+    # cache_dir keeps every response on disk (see ResponseCache), so finished tournaments are only fetched once.
+    # offline serves everything from cache_dir without the network
+    def __init__(self, api_key: str, subdomain: str, cache_dir: str = None, offline: bool = False):
         self.subdomain = subdomain
         if subdomain is None:
             self.subdomain_inject = ''
         else:
             self.subdomain_inject = f"{self.subdomain}-"
         self.api_key = api_key
-        challonge.set_credentials('dshupp',api_key)
+        self.cache = ResponseCache(cache_dir, offline) if cache_dir is not None else None
+        self.client = ChallongeClient(api_key, subdomain, cache=self.cache)
 
     # GET https://api.challonge.com/v1/tournaments/{tournament}.{json|xml}
     def print_tournament(self, id):
-        print(json.dumps(challonge.tournaments.show(id), indent=1))
+        print(json.dumps(self.client.tournament(id), indent=1))
 
     def get_tourney_list(self) -> {}:
 
@@ -47,7 +51,7 @@ class ChallongeTournament:
         else:
             self.account: ChallongeAccount = ChallongeAccount()
 
-        self.tourney_object = challonge.tournaments.show(tourney_id)
+        self.tourney_object = self.account.client.tournament(tourney_id)
         self.processing_errors = 0
         self.parent_tourney_name = parent_tourney_name
         self.tourney_id = tourney_id
@@ -68,7 +72,7 @@ class ChallongeTournament:
 
     # GET https://api.challonge.com/v1/tournaments/{tournament}/participants.{json|xml}
     def build_participants_list(self):
-        for participant in challonge.participants.index(self.tourney_object["id"]):
+        for participant in self.account.client.participants(self.tourney_id):
             team_id = participant['id']
             team_name = participant['name']
             self.teams[team_id] = team_name
@@ -81,7 +85,7 @@ class ChallongeTournament:
 
     def build_match_results(self):
         print("building match results for "+self.tourney_id)
-        for match in challonge.matches.index(self.tourney_id):
+        for match in self.account.client.matches(self.tourney_id):
             scores_csv: str = match["scores_csv"]
             if scores_csv is None or scores_csv == '':
                 team1wins = 'XXX'
@@ -122,7 +126,7 @@ class ChallongeTournament:
                 print(f"ERROR - Empty started_at in match {match}")
                 self.processing_errors += 1
             else:
-                time = match['started_at']
+                time = ChallongeClient.parse_time(match['started_at'])
 
             self.match_results.append(
                 [self.parent_tourney_name, self.bracket_name, team1name, team2name, team1wins, team2wins, time])
@@ -154,23 +158,24 @@ class ChallongeTournament:
                        match[3],
                        match[4],
                        match[5],
-                       datetime.datetime.strftime(match[6], KQTrueSkill.datetime_format)
+                       datetime.datetime.strftime(match[6], MATCHFILE_DATETIME_FORMAT)
                        ]
                 match_writer.writerow(row)
 
     def get_team_name_from_id(self, team_id):
         if team_id in self.teams.keys():
             return self.teams[team_id]
+        # group player ids were all mapped when the participants list was read
+        if team_id in self.group_ids:
+            self.teams[team_id] = self.group_ids[team_id]
+            return self.teams[team_id]
 
         try:
-            name = challonge.participants.show(self.tourney_id,team_id)['name']
+            path = f"{self.account.client.tournament_path(self.tourney_id)}/participants/{team_id}"
+            self.teams[team_id] = self.account.client.get(path)['participant']['name']
+            return self.teams[team_id]
         except:
-            for participant in challonge.participants.index(self.tourney_id):
-                if len(participant['group_player_ids']) > 0:
-                    if participant['group_player_ids'][0] == team_id:
-                        self.teams[team_id] = challonge.participants.show(self.tourney_id,participant['id'])['name']
-                        return self.teams[team_id]
-        raise Exception("didn't find a matching team")
+            raise Exception("didn't find a matching team")
 
 
 # BB3: [] = ['BB3', [{'id': 5057256, 'bracket': 'KO'},
@@ -481,12 +486,17 @@ def main():
     # cp.read('properties/api_keys.cfg')
     # api_key = cp.get('APIKeys', '')
 
-    account: ChallongeAccount = ChallongeAccount('OJxf8wmFKHb5afldGJ1HzTn5Omg4s7BcuevuQXCd', None)
-    account_kqsf: ChallongeAccount = ChallongeAccount('OJxf8wmFKHb5afldGJ1HzTn5Omg4s7BcuevuQXCd', 'kq-sf')
-    account_sfl: ChallongeAccount = ChallongeAccount('OJxf8wmFKHb5afldGJ1HzTn5Omg4s7BcuevuQXCd', 'hybridhypegaming')
-    account_stl: ChallongeAccount = ChallongeAccount('OJxf8wmFKHb5afldGJ1HzTn5Omg4s7BcuevuQXCd', 'killerqueenstl')
-    account_cha: ChallongeAccount = ChallongeAccount('OJxf8wmFKHb5afldGJ1HzTn5Omg4s7BcuevuQXCd',
-                                                     'killer-queen-chattanooga')
+    # the api key comes from the environment, eg CHALLONGE_API_KEY=... python challongeingest.py
+    api_key = os.environ.get('CHALLONGE_API_KEY')
+    if not api_key:
+        raise Exception("challongeingest: set CHALLONGE_API_KEY to your challonge api key")
+
+    # responses are kept in challonge_cache, so re-running only fetches tournaments that haven't finished
+    account: ChallongeAccount = ChallongeAccount(api_key, None, cache_dir='challonge_cache')
+    account_kqsf: ChallongeAccount = ChallongeAccount(api_key, 'kq-sf')
+    account_sfl: ChallongeAccount = ChallongeAccount(api_key, 'hybridhypegaming')
+    account_stl: ChallongeAccount = ChallongeAccount(api_key, 'killerqueenstl')
+    account_cha: ChallongeAccount = ChallongeAccount(api_key, 'killer-queen-chattanooga')
 
 
     # account.print_tournament('BKCRN2017')
@@ -0,0 +1,224 @@
+import concurrent.futures
+import csv
+import datetime
+import json
+import os
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from responsecache import ResponseCache
+
+# times in match results files, the same as KQTrueSkill.datetime_format. kept here so the ingest tools run from
+# their own directory, without KQTrueSkill.py on the path
+MATCHFILE_DATETIME_FORMAT: str = "%Y-%m-%dT%H:%M:%S%z"
+
+
+class ChallongeClient:
+    '''GETs against the Challonge v1 api, safe to share between threads. api_url can point anywhere that serves
+    the same paths, eg a ReplayServer (replayserver.py) replaying recorded responses.
+
+    With a ResponseCache (responsecache.py), a tournament response that says it's 'complete' is served from disk
+    without asking the api, and so are its participants & matches responses if they were fetched once the
+    tournament was already complete. Everything else is revalidated.'''
+    DATETIME_FORMAT: str = "%Y-%m-%dT%H:%M:%S.%f%z"
+    API_URL: str = "https://api.challonge.com/v1/"
+
+    def __init__(self, api_key: str, subdomain: str = None, api_url: str = None, timeout: float = 30,
+                 cache: ResponseCache = None):
+        self.api_key = api_key
+        self.subdomain = subdomain
+        if subdomain is None:
+            self.subdomain_inject = ''
+        else:
+            self.subdomain_inject = f"{self.subdomain}-"
+        self.api_url = api_url or self.API_URL
+        self.timeout = timeout
+        self.cache = cache
+
+    # path of a tournament relative to the api url, eg 'tournaments/HCC_KO'
+    def tournament_path(self, tourney_id) -> str:
+        return f"tournaments/{self.subdomain_inject}{tourney_id}"
+
+    # one GET, as If-None-Match if etag isn't None. returns (body, etag), body None if not modified
+    def fetch(self, path: str, etag: str = None):
+        url = f"{self.api_url}{path}.json?{urllib.parse.urlencode({'api_key': self.api_key})}"
+        request = urllib.request.Request(url, headers={} if etag is None else {'If-None-Match': etag})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as resp:
+                return resp.read().decode('utf-8'), resp.headers.get('ETag')
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None, etag
+            raise Exception(f"GET {path} {e.code}")
+
+    # the state of the tournament that path belongs to in the cache, eg 'underway' or 'complete', or None
+    def cached_state(self, path: str) -> str:
+        body = self.cache.read("/".join(path.split("/")[:2]))
+        try:
+            return None if body is None else json.loads(body)['tournament']['state']
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    # the raw response body for a path, eg 'tournaments/HCC_KO/matches'
+    def get_text(self, path: str) -> str:
+        if self.cache is None:
+            return self.fetch(path)[0]
+        if len(path.split("/")) <= 2:
+            # the tournament itself: a finished tournament doesn't change any more
+            return self.cache.get(path, self.fetch, final=self.cached_state(path) == 'complete')
+        # participants & matches are final only if the tournament was already complete when they were fetched.
+        # ones fetched while it was underway are revalidated, and recorded as complete then
+        return self.cache.get(path, self.fetch, final=self.cache.read(path, 'state') == 'complete',
+                              state=self.cached_state(path))
+
+    def get(self, path: str):
+        return json.loads(self.get_text(path))
+
+    # GET https://api.challonge.com/v1/tournaments/{tournament}.json
+    def tournament(self, tourney_id) -> {}:
+        return self.get(self.tournament_path(tourney_id))['tournament']
+
+    # GET https://api.challonge.com/v1/tournaments/{tournament}/participants.json
+    def participants(self, tourney_id) -> []:
+        return [p['participant'] for p in self.get(f"{self.tournament_path(tourney_id)}/participants")]
+
+    # GET https://api.challonge.com/v1/tournaments/{tournament}/matches.json
+    def matches(self, tourney_id) -> []:
+        return [m['match'] for m in self.get(f"{self.tournament_path(tourney_id)}/matches")]
+
+    @staticmethod
+    def parse_time(value: str) -> datetime.datetime:
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return datetime.datetime.strptime(value, ChallongeClient.DATETIME_FORMAT)
+
+
+class BracketResults:
+    '''The match results of one challonge sub-bracket, built from its fetched tournament, participants and matches
+    the same way as ChallongeTournament, with 'XXX' for anything that needs scrubbing. Team names for both
+    participant ids and the group_player_ids of multistage challonges come from one map built up front, instead
+    of going back to the api for each id it doesn't know. Like ChallongeTournament.get_bracket_name, the bracket
+    column is the challonge tournament's name, eg 'BB Remix Group A'.'''
+
+    def __init__(self, parent_tourney_name: str, tourney: {}, participants: [], matches: []):
+        self.parent_tourney_name = parent_tourney_name
+        self.bracket_name = tourney['name']
+        self.tourney_object = tourney
+        self.processing_errors = 0
+        self.errors = []
+        self.teams = {}
+        for participant in participants:
+            self.teams[participant['id']] = participant['name']
+            for gid in participant.get('group_player_ids') or []:
+                # in a multistage challonge, the player id in groups is a group_player_id on the participants list
+                self.teams.setdefault(gid, participant['name'])
+        self.match_results = [self.match_result(match) for match in matches]
+
+    def error(self, message: str):
+        self.errors.append(message)
+        self.processing_errors += 1
+
+    def team_name(self, match: {}, key: str) -> str:
+        team_id = match[key]
+        if team_id is None:
+            self.error(f"ERROR - Empty {key} in match {match}")
+            return 'XXX'
+        return self.teams.get(team_id, str(team_id))
+
+    def match_result(self, match: {}) -> []:
+        scores_csv: str = match["scores_csv"]
+        if scores_csv is None or scores_csv == '':
+            team1wins = 'XXX'
+            team2wins = 'XXX'
+            self.error(f"ERROR - Empty scores_csv in match {match}")
+        else:
+            scores_list: [] = scores_csv.split("-")
+            team1wins = scores_list[0]
+            team2wins = scores_list[1]
+
+        team1name = self.team_name(match, 'player1_id')
+        team2name = self.team_name(match, 'player2_id')
+
+        if match['started_at'] is None:
+            time = datetime.datetime.today()
+            self.error(f"ERROR - Empty started_at in match {match}")
+        else:
+            time = ChallongeClient.parse_time(match['started_at'])
+
+        return [self.parent_tourney_name, self.bracket_name, team1name, team2name, team1wins, team2wins, time]
+
+
+# fetch every sub-bracket of every tournament at once, tournaments as [name, [{'id': ..., 'bracket': ...}, ...]]
+# lists like the ones in challongeingest.py. as with get_match_results_from_challonge, 'bracket' isn't used: the
+# bracket column is the challonge tournament's name. each sub-bracket's tournament, participants and matches are
+# three independent requests, so all of them go to the thread pool together. returns a list of BracketResults per
+# tournament, in the order given
+def fetch_tournaments(client: ChallongeClient, tournaments: [], workers: int = 16) -> []:
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        pending = [[(pool.submit(client.tournament, subtourney['id']),
+                     pool.submit(client.participants, subtourney['id']),
+                     pool.submit(client.matches, subtourney['id'])) for subtourney in subtourney_list]
+                   for _, subtourney_list in tournaments]
+        return [[BracketResults(tourney_name, tourney.result(), participants.result(), matches.result())
+                 for tourney, participants, matches in brackets]
+                for (tourney_name, _), brackets in zip(tournaments, pending)]
+
+
+# writes rows in the same format as ChallongeTournament.write_matchfile, with the header unless appending
+def write_matchfile(brackets: [], filename: str, append=False):
+    with open(filename, mode='a' if append else 'w') as match_file:
+        match_writer = csv.writer(match_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        if not append:
+            match_writer.writerow(["tournament", "bracket",
+                                   "team1name", "team2name", "team1wins", "team2wins", "time"])
+        for bracket in brackets:
+            for match in bracket.match_results:
+                match_writer.writerow(match[:6] + [datetime.datetime.strftime(match[6], MATCHFILE_DATETIME_FORMAT)])
+
+
+# the concurrent version of get_match_results_from_challonge for any number of tournaments: fetches them all,
+# then writes them to one file in the order given. returns the number of processing errors
+def get_match_results(client: ChallongeClient, tournaments: [], filename: str, append=False, workers: int = 16) -> int:
+    results = fetch_tournaments(client, tournaments, workers)
+    brackets = [bracket for tourney in results for bracket in tourney]
+    for bracket in brackets:
+        for error in bracket.errors:
+            print(error)
+    write_matchfile(brackets, filename, append)
+    processing_errors = sum(bracket.processing_errors for bracket in brackets)
+    print(f"{len(brackets)} brackets, {sum(len(b.match_results) for b in brackets)} matches, "
+          f"{processing_errors} processing errors")
+    if client.cache is not None:
+        print(f"responses: {client.cache}")
+    return processing_errors
+
+
+def main():
+    HCC21: [] = ["HCC21", [{'id': 'HCC_GA', 'bracket': 'Group1'},
+                           {'id': 'HCC_GB', 'bracket': 'Group2'},
+                           {'id': 'HCC_GC', 'bracket': 'Group3'},
+                           {'id': 'HCC_KO', 'bracket': 'KO'},
+                           ]]
+    BBR: [] = ["BBR", [{'id': 'BB_Remix', 'bracket': 'KO'},
+                       {'id': 'BB_Remix_GroupA', 'bracket': 'GroupA'},
+                       {'id': 'BB_Remix_GroupB', 'bracket': 'GroupB'},
+                       {'id': 'BB_Remix_GroupC', 'bracket': 'GroupC'},
+                       {'id': 'BB_Remix_GroupD', 'bracket': 'GroupD'},
+                       ]]
+
+    # the api key comes from the environment, eg CHALLONGE_API_KEY=... python concurrentingest.py
+    api_key = os.environ.get('CHALLONGE_API_KEY')
+    if not api_key:
+        raise Exception("concurrentingest: set CHALLONGE_API_KEY to your challonge api key")
+    # finished tournaments come from challonge_cache after the first run. ResponseCache(..., offline=True) never
+    # touches the network
+    client: ChallongeClient = ChallongeClient(api_key, cache=ResponseCache('challonge_cache'))
+    # or replay recorded responses instead, see replayserver.py:
+    # client = ChallongeClient('', api_url=ReplayServer('recorded').start().url)
+    get_match_results(client, [HCC21, BBR], 'tmp.csv')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import hashlib
+import http.server
+import os
+import sys
+import threading
+import time
+import urllib.parse
+
+from concurrentingest import ChallongeClient
+
+
+# save the tournament, participants and matches responses for each tourney id to directory, as the files a
+# ReplayServer serves them from: {directory}/tournaments/{id}.json, {directory}/tournaments/{id}/matches.json etc
+def record(client: ChallongeClient, tourney_ids: [], directory: str):
+    for tourney_id in tourney_ids:
+        path = client.tournament_path(tourney_id)
+        for endpoint in (path, f"{path}/participants", f"{path}/matches"):
+            filename = os.path.join(directory, f"{endpoint}.json")
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(filename, mode='w', encoding='utf-8') as f:
+                f.write(client.get_text(endpoint))
+
+
+class ReplayHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        # everything after /v1/, without the query string (so any api key works)
+        path = urllib.parse.urlparse(self.path).path
+        relative = path[len(ReplayServer.PREFIX):] if path.startswith(ReplayServer.PREFIX) else ''
+        filename = os.path.normpath(os.path.join(self.server.directory, urllib.parse.unquote(relative)))
+        if not relative or not filename.startswith(self.server.directory + os.sep) or not os.path.isfile(filename):
+            self.send_error(404)
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with open(filename, mode='rb') as f:
+            body = f.read()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer:
+    '''A local stand-in for the Challonge api that serves responses recorded with record(), so ingest can be run
+    and checked without the network: ChallongeClient(api_key, api_url=server.url). Responses carry an ETag and
+    answer If-None-Match, so revalidating a ResponseCache works against it too. latency adds a delay to every
+    response, to see what fetching concurrently saves. port 0 picks a free port.'''
+    PREFIX: str = '/v1/'
+
+    def __init__(self, directory: str, port: int = 0, latency: float = 0):
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', port), ReplayHandler)
+        self.httpd.directory = os.path.abspath(directory)
+        self.httpd.latency = latency
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}{self.PREFIX}"
+
+    # serve from a background thread
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+# python replayserver.py <directory> [port]
+def main():
+    directory = sys.argv[1] if len(sys.argv) > 1 else 'recorded'
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8000
+    server = ReplayServer(directory, port)
+    print(f"replaying {server.httpd.directory} at {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import threading
+
+
+class ResponseCache:
+    '''Api responses on disk, one file per endpoint: {directory}/{path}.json, eg
+    {directory}/tournaments/HCC_KO/matches.json, the same layout replayserver.py records and serves, with the
+    response's ETag (if it sent one) alongside in {path}.etag, and the state the caller gave for it when it was
+    fetched (eg the state of the tournament it belongs to) in {path}.state.
+
+    get serves a final response (one that can't change any more) straight from disk. anything else is
+    revalidated with a conditional GET, and only downloaded again if it changed. offline serves everything from
+    disk and never touches the network. Safe to share between threads.'''
+
+    def __init__(self, directory: str, offline: bool = False):
+        self.directory = os.path.abspath(directory)
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.fetched = 0
+
+    def filename(self, path: str, extension: str = 'json') -> str:
+        return os.path.join(self.directory, f"{path}.{extension}")
+
+    # the cached body for path, or None
+    def read(self, path: str, extension: str = 'json'):
+        try:
+            with open(self.filename(path, extension), mode='r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, path: str, body: str, etag: str = None, state: str = None):
+        self.write_file(self.filename(path), body)
+        self.write_sidecar(path, 'etag', etag)
+        self.write_sidecar(path, 'state', state)
+
+    # {path}.{extension} holds text, or is removed if text is None
+    def write_sidecar(self, path: str, extension: str, text: str = None):
+        if text is not None:
+            self.write_file(self.filename(path, extension), text)
+        elif os.path.exists(self.filename(path, extension)):
+            os.remove(self.filename(path, extension))
+
+    # write to a temporary file and rename it into place, so other threads never read half a response
+    @staticmethod
+    def write_file(filename: str, text: str):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename), suffix='.tmp')
+        with os.fdopen(fd, mode='w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, filename)
+
+    def count(self, counter: str):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    # the body for path. fetch(path, etag) does the GET, sending etag as If-None-Match if it isn't None, and
+    # returns (body, etag), body None if the server said it hasn't changed. state is recorded with the response
+    # whenever it's fetched or revalidated, see read(path, 'state')
+    def get(self, path: str, fetch, final: bool = False, state: str = None) -> str:
+        body = self.read(path)
+        if body is not None and (final or self.offline):
+            self.count('hits')
+            return body
+        if self.offline:
+            raise Exception(f"ResponseCache: offline and {path} isn't cached in {self.directory}")
+
+        new_body, etag = fetch(path, self.read(path, 'etag') if body is not None else None)
+        if new_body is None:
+            self.write_sidecar(path, 'state', state)
+            self.count('revalidated')
+            return body
+        self.write(path, new_body, etag, state)
+        self.count('fetched')
+        return new_body
+
+    def __repr__(self):
+        return f"{self.hits} cached, {self.revalidated} revalidated, {self.fetched} fetched"
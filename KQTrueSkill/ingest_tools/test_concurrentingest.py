@@ -0,0 +1,38 @@
+import csv
+import json
+import os
+
+from concurrentingest import ChallongeClient, get_match_results
+from replayserver import ReplayServer
+
+
+# a challonge tournament with one 2-1 match between Team A & Team B, as replayserver.py serves it
+def record_bracket(directory: str, tourney_id: str, name: str):
+    responses = {f'tournaments/{tourney_id}': {'tournament': {'id': 1, 'name': name, 'state': 'complete'}},
+                 f'tournaments/{tourney_id}/participants': [{'participant': {'id': 1, 'name': 'Team A'}},
+                                                            {'participant': {'id': 2, 'name': 'Team B'}}],
+                 f'tournaments/{tourney_id}/matches': [{'match': {'player1_id': 1, 'player2_id': 2, 'scores_csv': '2-1',
+                                                                  'started_at': '2021-06-05T12:00:00.000-07:00'}}]}
+    for path, response in responses.items():
+        filename = os.path.join(directory, f"{path}.json")
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, mode='w', encoding='utf-8') as f:
+            json.dump(response, f)
+
+
+# the bracket column is the challonge tournament's name, like ChallongeTournament writes, not the config label
+def test_match_file_rows(tmp_path):
+    recorded = str(tmp_path / 'recorded')
+    record_bracket(recorded, 'BB_Remix', 'BB Remix')
+    record_bracket(recorded, 'BB_Remix_GroupA', 'BB Remix Group A')
+    filename = str(tmp_path / 'results.csv')
+    with ReplayServer(recorded) as server:
+        client = ChallongeClient('key', api_url=server.url)
+        errors = get_match_results(client, [["BBR", [{'id': 'BB_Remix', 'bracket': 'KO'},
+                                                     {'id': 'BB_Remix_GroupA', 'bracket': 'GroupA'}]]], filename)
+    assert errors == 0
+    with open(filename) as f:
+        rows = list(csv.reader(f))
+    assert rows == [["tournament", "bracket", "team1name", "team2name", "team1wins", "team2wins", "time"],
+                    ["BBR", "BB Remix", "Team A", "Team B", "2", "1", "2021-06-05T12:00:00-0700"],
+                    ["BBR", "BB Remix Group A", "Team A", "Team B", "2", "1", "2021-06-05T12:00:00-0700"]]
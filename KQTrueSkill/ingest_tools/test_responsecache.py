@@ -0,0 +1,45 @@
+import json
+import os
+
+from concurrentingest import ChallongeClient
+from replayserver import ReplayServer
+from responsecache import ResponseCache
+
+
+# one tournament T with one match, as replayserver.py serves them
+def record_tournament(directory: str, state: str, scores_csv: str):
+    responses = {'tournaments/T': {'tournament': {'id': 1, 'state': state}},
+                 'tournaments/T/participants': [{'participant': {'id': 1, 'name': 'Team A'}},
+                                                {'participant': {'id': 2, 'name': 'Team B'}}],
+                 'tournaments/T/matches': [{'match': {'player1_id': 1, 'player2_id': 2, 'scores_csv': scores_csv,
+                                                      'started_at': '2021-06-05T12:00:00.000-07:00'}}]}
+    for path, response in responses.items():
+        filename = os.path.join(directory, f"{path}.json")
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, mode='w', encoding='utf-8') as f:
+            json.dump(response, f)
+
+
+def test_responses_fetched_while_underway_are_revalidated_once_complete(tmp_path):
+    recorded = str(tmp_path / 'recorded')
+    record_tournament(recorded, 'underway', '1-0')
+    with ReplayServer(recorded) as server:
+        cache = ResponseCache(str(tmp_path / 'cache'))
+        client = ChallongeClient('key', api_url=server.url, cache=cache)
+        assert client.tournament('T')['state'] == 'underway'
+        assert client.matches('T')[0]['scores_csv'] == '1-0'
+
+        # the last game finishes the tournament
+        record_tournament(recorded, 'complete', '2-1')
+        assert client.tournament('T')['state'] == 'complete'
+        assert client.matches('T')[0]['scores_csv'] == '2-1'
+        assert client.participants('T')[0]['name'] == 'Team A'
+        assert cache.read('tournaments/T/matches', 'state') == 'complete'
+
+        # fetched after it was complete, they're final now: served from disk without asking the server
+        record_tournament(recorded, 'complete', '3-0')
+        hits = cache.hits
+        assert client.tournament('T')['state'] == 'complete'
+        assert client.matches('T')[0]['scores_csv'] == '2-1'
+        assert client.participants('T')[0]['name'] == 'Team A'
+        assert cache.hits == hits + 3
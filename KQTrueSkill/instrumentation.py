@@ -0,0 +1,154 @@
+import contextlib
+import cProfile
+import functools
+import json
+import time
+
+# what stage() hands out while disabled: reusable, and does nothing
+NO_STAGE = contextlib.nullcontext()
+END = object()
+
+
+class Stage:
+    '''Times one pass through a stage, see Instrumentation.stage.'''
+    __slots__ = ('instrumentation', 'name', 'started')
+
+    def __init__(self, instrumentation, name: str):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.instrumentation.add_time(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class Instrumentation:
+    '''Where KQTrueSkill spends its time: wall time & calls per stage (parse, ingest, sort, schedule, rate, apply,
+    observers, snapshot, checkpoint, state, export), wall time, matches & games per tournament as it's rated, and
+    counters (games rated, engine calls, bots padded, observer calls, ...). The stages KQTrueSkill marks don't
+    overlap, so their times add up.
+
+    Disabled, which is the default, stage() returns a shared no-op context manager and count() returns straight
+    away, so leaving the calls in the rating loop costs next to nothing. Pass an enabled one to KQTrueSkill:
+    KQTrueSkill(instrumentation=Instrumentation(enabled=True)). With replay worker processes, tournament times
+    are as seen from this process, and the workers' rating shows up as time spent waiting in 'rate'.'''
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.stage_seconds = {}
+        self.stage_calls = {}
+        self.counters = {}
+        self.tournament_seconds = {}
+        self.tournament_matches = {}
+        self.tournament_games = {}
+        self.current_tournament = None
+        self.tournament_started = 0.0
+
+    # with instrumentation.stage('rate'): ...
+    def stage(self, name: str):
+        if not self.enabled:
+            return NO_STAGE
+        return Stage(self, name)
+
+    def add_time(self, name: str, seconds: float):
+        self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+        self.stage_calls[name] = self.stage_calls.get(name, 0) + 1
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    # items from iterable, the time spent producing each one added to stage name. for lazily parsed input
+    def iterate(self, iterable, name: str):
+        if not self.enabled:
+            return iterable
+        return self.timed_iteration(iter(iterable), name)
+
+    def timed_iteration(self, iterator, name: str):
+        while True:
+            with self.stage(name):
+                item = next(iterator, END)
+            if item is END:
+                return
+            yield item
+
+    # rating is on tournament now, or stopped if it's None. the time since rating moved on to the previous
+    # tournament goes to that one
+    def tournament(self, tournament):
+        if not self.enabled or tournament == self.current_tournament:
+            return
+        now = time.perf_counter()
+        if self.current_tournament is not None:
+            self.tournament_seconds[self.current_tournament] = \
+                self.tournament_seconds.get(self.current_tournament, 0.0) + now - self.tournament_started
+        self.current_tournament = tournament
+        self.tournament_started = now
+
+    def count_match(self, tournament: str, games: int):
+        if self.enabled:
+            self.tournament_matches[tournament] = self.tournament_matches.get(tournament, 0) + 1
+            self.tournament_games[tournament] = self.tournament_games.get(tournament, 0) + games
+
+    # everything recorded, as plain dicts & numbers
+    def report(self) -> {}:
+        return {
+            'stages': {name: {'seconds': seconds, 'calls': self.stage_calls[name]}
+                       for name, seconds in self.stage_seconds.items()},
+            'counters': dict(self.counters),
+            'tournaments': {tournament: {'seconds': seconds,
+                                         'matches': self.tournament_matches.get(tournament, 0),
+                                         'games': self.tournament_games.get(tournament, 0)}
+                            for tournament, seconds in self.tournament_seconds.items()},
+        }
+
+    def write_report(self, filename: str):
+        with open(filename, mode='w') as f:
+            json.dump(self.report(), f, indent=1)
+
+    # the report as text: stages slowest first, then counters, then the slowest tournaments
+    def format_report(self, tournaments: int = 10) -> str:
+        report = self.report()
+        total = sum(stage['seconds'] for stage in report['stages'].values())
+        lines = [f"stages, {total:.3f}s in all:"]
+        for name, stage in sorted(report['stages'].items(), key=lambda item: -item[1]['seconds']):
+            lines.append(f"  {name}: {stage['seconds']:.3f}s, {stage['calls']} calls")
+        lines.append("counters:")
+        for name, value in sorted(report['counters'].items()):
+            lines.append(f"  {name}: {value}")
+        lines.append(f"slowest tournaments, of {len(report['tournaments'])}:")
+        for tournament, timing in sorted(report['tournaments'].items(),
+                                         key=lambda item: -item[1]['seconds'])[:tournaments]:
+            lines.append(f"  {tournament}: {timing['seconds']:.3f}s, {timing['matches']} matches, "
+                         f"{timing['games']} games")
+        return "\n".join(lines)
+
+    # cProfile everything run inside, and dump the stats to filename for pstats or snakeviz, eg
+    # with instrumentation.profile('kq.prof'): history = KQTrueSkill(instrumentation=instrumentation)
+    @contextlib.contextmanager
+    def profile(self, filename: str):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            profiler.dump_stats(filename)
+
+
+# method decorator: every call to the method is timed as stage name of self.instrumentation
+def instrumented(name: str):
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.instrumentation.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
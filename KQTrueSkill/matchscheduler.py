@@ -0,0 +1,71 @@
+# split a time ordered list of matches into waves: runs of consecutive matches where no player appears in more
+# than one match, all from the same tournament. every match in a wave starts from ratings none of the others
+# change, so rating a wave as one batch gives exactly the results of rating its matches one by one.
+# tournaments[i] & players[i] are the tournament & the player ids (both teams) of match i.
+# returns [(start, stop), ...] covering every match, in order
+def schedule_waves(tournaments: [], players: [], max_wave_size: int = None) -> []:
+    waves = []
+    start = 0
+    wave_players = set()
+    for i, (tournament, match_players) in enumerate(zip(tournaments, players)):
+        if i > start and (tournament != tournaments[start] or
+                          not wave_players.isdisjoint(match_players) or
+                          (max_wave_size is not None and i - start >= max_wave_size)):
+            waves.append((start, i))
+            start = i
+            wave_players = set()
+        wave_players.update(match_players)
+    if start < len(tournaments):
+        waves.append((start, len(tournaments)))
+    return waves
+
+
+# group matches by which players interact: two matches are in the same component if a chain of shared players
+# links them. players[i] are the player ids (both teams) of match i. returns a component label per match
+def interaction_components(players: []) -> []:
+    parent = {}
+
+    def find(player):
+        root = player
+        while parent[root] != root:
+            root = parent[root]
+        while parent[player] != root:
+            parent[player], player = root, parent[player]
+        return root
+
+    for match_players in players:
+        for player in match_players:
+            parent.setdefault(player, player)
+        first = find(match_players[0])
+        for player in match_players[1:]:
+            root = find(player)
+            if root != first:
+                parent[root] = first
+    return [find(match_players[0]) for match_players in players]
+
+
+# spread components over at most parts partitions with about the same number of matches each, biggest components
+# first. returns the non-empty partitions as lists of match indexes, in order
+def partition_components(labels: [], parts: int) -> []:
+    components = {}
+    for i, label in enumerate(labels):
+        components.setdefault(label, []).append(i)
+    partitions = [[] for _ in range(min(parts, len(components)))]
+    for component in sorted(components.values(), key=len, reverse=True):
+        min(partitions, key=len).extend(component)
+    return [sorted(partition) for partition in partitions if partition]
+
+
+# the earliest batch each match can be rated in, ignoring tournaments: one after the latest batch holding an
+# earlier match of any of its players. rating level 0, then level 1, and so on, one batch per level, gives
+# exactly the ratings of rating the matches one by one, in far fewer batches than schedule_waves, but without
+# tournament boundaries for snapshots. players[i] are the player ids (both teams) of match i
+def dependency_levels(players: []) -> []:
+    latest = {}  # latest[player id] = level of their last match so far
+    levels = []
+    for match_players in players:
+        level = 1 + max((latest.get(player, -1) for player in match_players), default=-1)
+        for player in match_players:
+            latest[player] = level
+        levels.append(level)
+    return levels
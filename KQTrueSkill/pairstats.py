@@ -0,0 +1,152 @@
+import numpy as np
+
+
+class PairStatsStore:
+    '''Wins, losses, net rating change & tournaments played for ordered pairs of players (my id, other id),
+    one row per pair in parallel numpy arrays. Rows are found through a sparse index on both player ids, and
+    through a list per player of the rows of their pairs in the order they first met. Each row's tournaments
+    are a bitset over tournament ids.
+
+    Checkpoints are undo logs: the first time a row changes after a checkpoint its old values are saved, and
+    rows added since the checkpoint are dropped when it's restored.'''
+
+    def __init__(self):
+        self.rows = {}  # rows[pair_key(my id, other id)] = row
+        self.player_rows = {}  # player_rows[my id] = [row, ...] in the order the pairs first met
+        self.size = 0
+        self.my_ids = np.zeros(0, dtype=np.int64)
+        self.other_ids = np.zeros(0, dtype=np.int64)
+        self.wins = np.zeros(0, dtype=np.int64)
+        self.losses = np.zeros(0, dtype=np.int64)
+        self.net_rating_change = np.zeros(0)
+        self.tournaments = np.zeros((0, 1), dtype=np.uint64)  # bit (id % 64) of tournaments[row, id // 64]
+        self.undo_logs = []  # per checkpoint, (size, [(rows, wins, losses, net_rating_change, tournaments), ...])
+        self.logged = set()  # rows already saved in the newest undo log
+
+    @staticmethod
+    def pair_key(my_id: int, other_id: int) -> int:
+        return my_id << 32 | other_id
+
+    def _grow(self, size: int):
+        capacity = max(1024, len(self.wins))
+        while capacity < size:
+            capacity *= 2
+        for field in ('my_ids', 'other_ids', 'wins', 'losses', 'net_rating_change', 'tournaments'):
+            old = getattr(self, field)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, field, new)
+
+    def _grow_tournaments(self, tournament_id: int):
+        words = tournament_id // 64 + 1
+        if words > self.tournaments.shape[1]:
+            tournaments = np.zeros((len(self.tournaments), words), dtype=np.uint64)
+            tournaments[:, :self.tournaments.shape[1]] = self.tournaments
+            self.tournaments = tournaments
+            for _, undo_log in self.undo_logs:
+                for i, (rows, wins, losses, net_rating_change, old_tournaments) in enumerate(undo_log):
+                    padded = np.zeros((len(rows), words), dtype=np.uint64)
+                    padded[:, :old_tournaments.shape[1]] = old_tournaments
+                    undo_log[i] = (rows, wins, losses, net_rating_change, padded)
+
+    # row of each (my_ids[i], other_ids[i]) pair, adding rows for pairs that haven't met before
+    def rows_for(self, my_ids: [], other_ids: []) -> []:
+        rows = []
+        for my_id, other_id in zip(my_ids, other_ids):
+            key = self.pair_key(my_id, other_id)
+            row = self.rows.get(key)
+            if row is None:
+                if self.size == len(self.wins):
+                    self._grow(self.size + 1)
+                row = self.size
+                self.size += 1
+                self.rows[key] = row
+                self.player_rows.setdefault(my_id, []).append(row)
+                self.my_ids[row] = my_id
+                self.other_ids[row] = other_id
+            rows.append(row)
+        return rows
+
+    # add one match to each (my_ids[i], other_ids[i]) pair, given as lists of ints. wins, losses &
+    # rating_changes are scalars or arrays parallel to the ids. a pair listed twice is counted twice
+    def aggregate(self, my_ids: [], other_ids: [], wins, losses, rating_changes, tournament_id: int):
+        rows = self.rows_for(my_ids, other_ids)
+        self._grow_tournaments(tournament_id)
+        if self.undo_logs:
+            self._log_undo(rows)
+        unique_rows = set(rows)
+        rows = np.array(rows, dtype=np.int64)
+        if len(unique_rows) == len(rows):
+            self.wins[rows] += wins
+            self.losses[rows] += losses
+            self.net_rating_change[rows] += rating_changes
+        else:
+            np.add.at(self.wins, rows, wins)
+            np.add.at(self.losses, rows, losses)
+            np.add.at(self.net_rating_change, rows, rating_changes)
+        self.tournaments[rows, tournament_id // 64] |= np.uint64(1 << (tournament_id % 64))
+
+    def _log_undo(self, rows: []):
+        checkpoint_size, undo_log = self.undo_logs[-1]
+        rows = [row for row in set(rows) if row < checkpoint_size and row not in self.logged]
+        if len(rows) > 0:
+            self.logged.update(rows)
+            rows = np.array(rows, dtype=np.int64)
+            undo_log.append((rows, self.wins[rows], self.losses[rows], self.net_rating_change[rows],
+                             self.tournaments[rows]))
+
+    # returns a token to hand to restore()
+    def checkpoint(self) -> int:
+        self.undo_logs.append((self.size, []))
+        self.logged = set()
+        return len(self.undo_logs) - 1
+
+    # rewind to a checkpoint. later checkpoints are discarded, the restored one stays usable
+    def restore(self, checkpoint: int):
+        for _, undo_log in reversed(self.undo_logs[checkpoint:]):
+            for rows, wins, losses, net_rating_change, tournaments in reversed(undo_log):
+                self.wins[rows] = wins
+                self.losses[rows] = losses
+                self.net_rating_change[rows] = net_rating_change
+                self.tournaments[rows] = tournaments
+        size = self.undo_logs[checkpoint][0]
+        # rows are handed out in order, so the dropped ones are at the end of each player's list
+        for my_id, other_id in reversed(list(zip(self.my_ids[size:self.size].tolist(),
+                                                 self.other_ids[size:self.size].tolist()))):
+            del self.rows[self.pair_key(my_id, other_id)]
+            player_rows = self.player_rows[my_id]
+            player_rows.pop()
+            if not player_rows:
+                del self.player_rows[my_id]
+        for field in ('wins', 'losses', 'net_rating_change', 'tournaments'):
+            getattr(self, field)[size:self.size] = 0
+        self.size = size
+        del self.undo_logs[checkpoint + 1:]
+        self.undo_logs[checkpoint] = (size, [])
+        self.logged = set()
+
+    # rows of every pair starting with my_id, in the order they first met
+    def rows_of(self, my_id: int) -> []:
+        return self.player_rows.get(my_id, [])
+
+    # ids of every player with at least one pair, in id order
+    def player_ids(self) -> []:
+        return sorted(self.player_rows)
+
+    def tournament_ids(self, row: int) -> []:
+        ids = []
+        for word, bits in enumerate(self.tournaments[row].tolist()):
+            while bits:
+                low_bit = bits & -bits
+                ids.append(word * 64 + low_bit.bit_length() - 1)
+                bits ^= low_bit
+        return ids
+
+    # undo logs only make sense next to the checkpoints they were made for, which aren't saved
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for field in ('my_ids', 'other_ids', 'wins', 'losses', 'net_rating_change', 'tournaments'):
+            state[field] = state[field][:self.size].copy()
+        state['undo_logs'] = []
+        state['logged'] = set()
+        return state
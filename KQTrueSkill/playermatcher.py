@@ -0,0 +1,126 @@
+import collections
+import csv
+import re
+import unicodedata
+from dataclasses import dataclass, field
+
+from KQTrueSkill import fill_blank_teams, read_player_file
+
+
+# lower case, accents and punctuation dropped, single spaces: 'Zoë  O'Neil' -> 'zoe o neil'
+def normalize_name(name: str) -> str:
+    name = unicodedata.normalize('NFKD', name or '')
+    name = "".join(c for c in name if not unicodedata.combining(c)).casefold()
+    return " ".join(re.split(r'[\W_]+', name)).strip()
+
+
+# the distinct character trigrams of a normalized name, padded so the first & last letters of each word count
+def trigrams(name: str) -> set:
+    padded = f" {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    '''Fuzzy lookup over a fixed list of names through an inverted index of character trigrams. A search only
+    scores the names sharing a trigram with the query, by the Dice coefficient of the two trigram sets
+    (2 * shared / (query's + name's)), so typos, dropped letters, punctuation, accents and swapped word order
+    all still score high, and it takes well under a millisecond over thousands of names.'''
+
+    def __init__(self, names):
+        self.names = list(dict.fromkeys(names))
+        self.normalized = [normalize_name(name) for name in self.names]
+        self.by_normalized = collections.defaultdict(list)
+        self.postings = collections.defaultdict(list)
+        self.sizes = []
+        for i, normalized in enumerate(self.normalized):
+            self.by_normalized[normalized].append(i)
+            grams = trigrams(normalized)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(i)
+
+    def __len__(self):
+        return len(self.names)
+
+    # whether name is indexed, up to case, accents, punctuation & spacing
+    def __contains__(self, name):
+        return normalize_name(name) in self.by_normalized
+
+    # [(name, score), ...] best first, at most limit of them, none scoring below min_score. names that only
+    # differ from the query in case, accents, punctuation or spacing score 1
+    def search(self, name: str, limit: int = 5, min_score: float = 0.3) -> []:
+        normalized = normalize_name(name)
+        grams = trigrams(normalized)
+        shared = collections.Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        scores = {i: 2 * count / (len(grams) + self.sizes[i]) for i, count in shared.items()}
+        for i in self.by_normalized.get(normalized, ()):
+            scores[i] = 1.0
+        best = sorted((i for i, score in scores.items() if score >= min_score), key=lambda i: (-scores[i], i))
+        return [(self.names[i], scores[i]) for i in best[:limit]]
+
+
+@dataclass
+class PlayerMatch:
+    '''One row of a players file and the known players it could be. exact is the row's name as it is already
+    known, with no fuzzy matching needed.'''
+    tournament: str
+    team: str
+    player: str
+    scene: str
+    exact: bool
+    candidates: [] = field(default_factory=list)  # [(known player, their scene, score), ...] best first
+
+
+class PlayerMatcher:
+    '''Resolves player names from a new team sheet against every player already known to a history, so a
+    player spelled differently in a new event's sheet can be given the name their ratings are under. Candidates
+    come from a NameIndex over the known names, and one from the same scene as the row gets scene_bonus added
+    to its score, which is what decides between two similar names.'''
+
+    def __init__(self, playerscenes: dict, scene_bonus: float = 0.1):
+        self.playerscenes = playerscenes
+        self.index = NameIndex(playerscenes.keys())
+        self.scene_bonus = scene_bonus
+
+    @classmethod
+    def from_history(cls, history, scene_bonus: float = 0.1):
+        return cls(history.playerscenes, scene_bonus)
+
+    # [(known player, their scene, score), ...] best first
+    def candidates(self, playername: str, playerscene: str = None, limit: int = 5, min_score: float = 0.3) -> []:
+        # look deeper than limit, since the scene bonus can move names up
+        found = self.index.search(playername, limit * 4, min_score)
+        scene = normalize_name(playerscene) if playerscene else None
+        scored = [(name, self.playerscenes[name],
+                   score + (self.scene_bonus if scene and normalize_name(self.playerscenes[name] or '') == scene
+                            else 0)) for name, score in found]
+        scored.sort(key=lambda candidate: -candidate[2])
+        return scored[:limit]
+
+    def match(self, tournament: str, team: str, playername: str, playerscene: str, limit: int = 3) -> PlayerMatch:
+        if playername in self.playerscenes:
+            return PlayerMatch(tournament, team, playername, playerscene, True)
+        return PlayerMatch(tournament, team, playername, playerscene, False,
+                           self.candidates(playername, playerscene, limit))
+
+    # a PlayerMatch for every row of a players file (tournament, team name, player, scene, like the datasets).
+    # a blank team is the previous row's, as when the file is ingested
+    def match_file(self, filename: str, limit: int = 3) -> []:
+        _, rows = read_player_file(filename)
+        return [self.match(row[0], row[1], row[2], row[3] if len(row) > 3 else None, limit)
+                for row in fill_blank_teams([row for row in rows if len(row) > 2])]
+
+    # writes the rows that aren't exact, with their best candidates, for scrubbing
+    @staticmethod
+    def write_matches(matches: [], filename: str, limit: int = 3):
+        with open(filename, mode='w', encoding='utf-8', newline='') as csv_file:
+            writer = csv.writer(csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(["tournament", "team", "player", "scene"] +
+                            [f"{column}{n + 1}" for n in range(limit) for column in ("candidate", "scene", "score")])
+            for m in matches:
+                if not m.exact:
+                    writer.writerow([m.tournament, m.team, m.player, m.scene] +
+                                    [value for name, scene, score in m.candidates[:limit]
+                                     for value in (name, scene, f"{score:.3f}")])
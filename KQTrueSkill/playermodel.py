@@ -0,0 +1,156 @@
+from collections.abc import MutableMapping
+
+import numpy as np
+from trueskill import Rating
+
+
+class PlayerModel:
+    '''Players as dense integer ids, with ratings & w/l counts held in parallel numpy arrays
+    (mu[id], sigma[id], games[id], ...) instead of dicts keyed by name.
+
+    Ids are never reused. A player removed from history is marked inactive, and gets the same id back if
+    they're added again.'''
+
+    def __init__(self, initial_rating: Rating):
+        self.ids = {}  # ids[playername] = player id
+        self.names = []  # names[player id] = playername
+        self.initial_mu: float = initial_rating.mu
+        self.initial_sigma: float = initial_rating.sigma
+        self.size = 0
+        self.active = np.zeros(0, dtype=bool)
+        self.mu = np.zeros(0)
+        self.sigma = np.zeros(0)
+        self.games = np.zeros(0, dtype=np.int64)
+        self.wins = np.zeros(0, dtype=np.int64)
+        self.losses = np.zeros(0, dtype=np.int64)
+
+    def _grow(self):
+        capacity = max(64, 2 * len(self.mu))
+        for field in ('active', 'mu', 'sigma', 'games', 'wins', 'losses'):
+            old = getattr(self, field)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, field, new)
+
+    # returns the player's id, adding them with a fresh rating if they're new or were removed
+    def add(self, name: str) -> int:
+        if name in self.ids:
+            player_id = self.ids[name]
+            if self.active[player_id]:
+                return player_id
+        else:
+            if self.size == len(self.mu):
+                self._grow()
+            player_id = self.size
+            self.size += 1
+            self.ids[name] = player_id
+            self.names.append(name)
+        self.active[player_id] = True
+        self.reset_player(player_id)
+        return player_id
+
+    def remove(self, name: str):
+        self.active[self.ids[name]] = False
+
+    def id(self, name: str) -> int:
+        player_id = self.ids[name]
+        if not self.active[player_id]:
+            raise KeyError(name)
+        return player_id
+
+    def ids_for(self, names: []) -> np.ndarray:
+        return np.array([self.id(name) for name in names], dtype=np.int64)
+
+    def initial_rating(self) -> Rating:
+        return Rating(mu=self.initial_mu, sigma=self.initial_sigma)
+
+    def rating(self, player_id: int) -> Rating:
+        return Rating(mu=float(self.mu[player_id]), sigma=float(self.sigma[player_id]))
+
+    def reset_player(self, player_id: int):
+        self.mu[player_id] = self.initial_mu
+        self.sigma[player_id] = self.initial_sigma
+        self.games[player_id] = 0
+        self.wins[player_id] = 0
+        self.losses[player_id] = 0
+
+    # fresh ratings & zero w/l counts for everyone
+    def reset(self):
+        self.mu[:self.size] = self.initial_mu
+        self.sigma[:self.size] = self.initial_sigma
+        self.games[:self.size] = 0
+        self.wins[:self.size] = 0
+        self.losses[:self.size] = 0
+
+    # a copy of every player's rating & w/l counts, for restore_state
+    def copy_state(self) -> tuple:
+        n = self.size
+        return (self.mu[:n].copy(), self.sigma[:n].copy(),
+                self.games[:n].copy(), self.wins[:n].copy(), self.losses[:n].copy())
+
+    # players added since the state was copied start fresh
+    def restore_state(self, state: tuple):
+        mu, sigma, games, wins, losses = state
+        self.reset()
+        n = len(mu)
+        self.mu[:n] = mu
+        self.sigma[:n] = sigma
+        self.games[:n] = games
+        self.wins[:n] = wins
+        self.losses[:n] = losses
+
+    def active_names(self) -> []:
+        return [self.names[player_id] for player_id in np.flatnonzero(self.active[:self.size])]
+
+
+class RatingsView(MutableMapping):
+    '''playerratings[playername] = Rating, backed by PlayerModel.mu & PlayerModel.sigma.'''
+
+    def __init__(self, model: PlayerModel):
+        self.model = model
+
+    def __getitem__(self, name: str) -> Rating:
+        return self.model.rating(self.model.id(name))
+
+    def __setitem__(self, name: str, rating: Rating):
+        player_id = self.model.id(name)
+        self.model.mu[player_id] = rating.mu
+        self.model.sigma[player_id] = rating.sigma
+
+    def __delitem__(self, name: str):
+        self.model.remove(name)
+
+    def __contains__(self, name):
+        return name in self.model.ids and self.model.active[self.model.ids[name]]
+
+    def __iter__(self):
+        return iter(self.model.active_names())
+
+    def __len__(self):
+        return int(self.model.active[:self.model.size].sum())
+
+
+class CounterView(MutableMapping):
+    '''playergames[playername] = int (or playerwins, playerlosses), backed by one PlayerModel array.'''
+
+    def __init__(self, model: PlayerModel, field: str):
+        self.model = model
+        self.field = field
+
+    def __getitem__(self, name: str) -> int:
+        return int(getattr(self.model, self.field)[self.model.id(name)])
+
+    def __setitem__(self, name: str, value: int):
+        getattr(self.model, self.field)[self.model.id(name)] = value
+
+    def __delitem__(self, name: str):
+        self.model.remove(name)
+
+    def __contains__(self, name):
+        return name in self.model.ids and self.model.active[self.model.ids[name]]
+
+    def __iter__(self):
+        return iter(self.model.active_names())
+
+    def __len__(self):
+        return int(self.model.active[:self.model.size].sum())
@@ -1,6 +1,5 @@
-import csv
-
 from KQTrueSkill.KQtrueskill import KQTrueSkill
+from playermatcher import PlayerMatcher
 
 
 
@@ -9,30 +8,14 @@ def compare_players_to_history(history: KQTrueSkill, filename: str = None):
     if filename is None:
         filename = 'datasets/BB Players.csv'
 
-    not_found = []
-    with open(filename) as csv_file:
-        csv_reader = csv.reader(csv_file, delimiter=',')
-        line_count = 0
-        for row in csv_reader:
-            if line_count == 0:
-                line_count += 1
-            else:
-                line_count +=1
-                print(line_count)
-                tournament = row[0]
-                playerteam = row[1]
-                playername = row[2]
-                playerscene = row[3]
-
-                if playername not in history.playerteams.keys():
-                    p = f"{playername} / {playerscene} not found. {tournament}/{playerteam} *************************"
-                    # print(p)
-                    not_found.append(p)
-    all_players_sorted = sorted(history.get_player_scene_list() + not_found)
-    for p in all_players_sorted:
-        print(p)
-    for p in not_found:
-        print(p)
+    # fuzzy candidates for every player not already in the history, best first, see playermatcher.py
+    matcher = PlayerMatcher.from_history(history)
+    not_found = [m for m in matcher.match_file(filename) if not m.exact]
+    for m in not_found:
+        candidates = ", ".join(f"{name} / {scene} ({score:.2f})" for name, scene, score in m.candidates)
+        print(f"{m.player} / {m.scene} not found. {m.tournament}/{m.team}: {candidates or 'no candidates'}")
+    print(f"{len(not_found)} players not found")
+    return not_found
 
 
     # history.write_player_ratings('2018 KQ - HH1 game results.csv')
@@ -0,0 +1,246 @@
+import math
+
+import numpy as np
+import trueskill
+from trueskill import Rating
+
+
+# numpy versions of the default trueskill backend (trueskill.backends), so the fast path
+# agrees with the library to within floating point noise
+def erfc(x):
+    z = np.abs(x)
+    t = 1. / (1. + z / 2.)
+    r = t * np.exp(-z * z - 1.26551223 + t * (1.00002368 + t * (
+        0.37409196 + t * (0.09678418 + t * (-0.18628806 + t * (
+            0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (
+                -0.82215223 + t * 0.17087277
+            )))
+        )))
+    )))
+    return np.where(x < 0, 2. - r, r)
+
+
+def cdf(x):
+    return 0.5 * erfc(-x / math.sqrt(2))
+
+
+def pdf(x):
+    return np.exp(-(x ** 2) / 2) / math.sqrt(2 * math.pi)
+
+
+# since we don't have game order, alternate winners where you can.
+# returns a list of booleans, True when team 1 won that game
+def game_outcomes(team1wins: int, team2wins: int) -> []:
+    outcomes = []
+    for x in range(max(team1wins, team2wins)):
+        if x < team1wins:
+            outcomes.append(True)
+        if x < team2wins:
+            outcomes.append(False)
+    return outcomes
+
+
+class RatingEngine:
+    '''Rates a match between two teams by calling trueskill.rate() once per game.
+    This is the reference implementation, and handles any trueskill environment.'''
+
+    def __init__(self, env: trueskill.TrueSkill = None):
+        if env is None:
+            env = trueskill.global_env()
+        self.env = env
+
+    # trueskill environments can't be pickled, so an engine sent to a worker process takes the environment's
+    # settings along and builds its own
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        env = state.pop('env')
+        state['env_settings'] = (env.mu, env.sigma, env.beta, env.tau, env.draw_probability, env.backend)
+        return state
+
+    def __setstate__(self, state):
+        mu, sigma, beta, tau, draw_probability, backend = state.pop('env_settings')
+        self.__dict__.update(state)
+        self.env = trueskill.TrueSkill(mu, sigma, beta, tau, draw_probability, backend)
+
+    # expects lists of ratings objects for the 2 teams, bots included. returns the new lists
+    def rate_match(self, t1ratings: [], t2ratings: [], team1wins: int, team2wins: int):
+        for team1_won in game_outcomes(team1wins, team2wins):
+            if team1_won:
+                t1ratings, t2ratings = self.env.rate([t1ratings, t2ratings], ranks=[0, 1])
+            else:
+                t1ratings, t2ratings = self.env.rate([t1ratings, t2ratings], ranks=[1, 0])
+        return list(t1ratings), list(t2ratings)
+
+    # same as rate_match, for numpy arrays of mu & sigma. returns new (mu1, sigma1, mu2, sigma2) arrays
+    def rate_match_arrays(self, mu1, sigma1, mu2, sigma2, team1wins: int, team2wins: int):
+        t1ratings = [Rating(mu=float(mu), sigma=float(sigma)) for mu, sigma in zip(mu1, sigma1)]
+        t2ratings = [Rating(mu=float(mu), sigma=float(sigma)) for mu, sigma in zip(mu2, sigma2)]
+        t1ratings, t2ratings = self.rate_match(t1ratings, t2ratings, team1wins, team2wins)
+        return (np.array([r.mu for r in t1ratings]), np.array([r.sigma for r in t1ratings]),
+                np.array([r.mu for r in t2ratings]), np.array([r.sigma for r in t2ratings]))
+
+    # rate several independent matches at once. mu & sigma are (matches, players) arrays, team1wins & team2wins
+    # have one entry per match. returns new (mu1, sigma1, mu2, sigma2) arrays of the same shapes
+    def rate_matches_arrays(self, mu1, sigma1, mu2, sigma2, team1wins, team2wins):
+        results = [self.rate_match_arrays(mu1[i], sigma1[i], mu2[i], sigma2[i], int(team1wins[i]), int(team2wins[i]))
+                   for i in range(len(mu1))]
+        return tuple(np.array([result[k] for result in results]) for k in range(4))
+
+
+class TwoTeamEngine(RatingEngine):
+    '''Applies the closed-form two team, no draw trueskill update directly to arrays of mu & sigma.
+
+    Every KQ game is two teams with no draws, so the factor graph trueskill.rate() builds always reduces
+    to a single truncated gaussian. Falls back to trueskill.rate() for environments with a draw probability.'''
+
+    def __init__(self, env: trueskill.TrueSkill = None):
+        super().__init__(env)
+        self.draw_margins = {}  # draw_margins[total players] = margin, always ~0 for draw_probability=0
+
+    def supports(self) -> bool:
+        return not callable(self.env.draw_probability) and self.env.draw_probability == 0
+
+    def rate_match(self, t1ratings: [], t2ratings: [], team1wins: int, team2wins: int):
+        if not self.supports():
+            return super().rate_match(t1ratings, t2ratings, team1wins, team2wins)
+
+        mu1, sigma1, mu2, sigma2 = self.rate_match_arrays(
+            np.array([r.mu for r in t1ratings]), np.array([r.sigma for r in t1ratings]),
+            np.array([r.mu for r in t2ratings]), np.array([r.sigma for r in t2ratings]),
+            team1wins, team2wins)
+        return ([Rating(mu=float(mu1[i]), sigma=float(sigma1[i])) for i in range(len(t1ratings))],
+                [Rating(mu=float(mu2[i]), sigma=float(sigma2[i])) for i in range(len(t2ratings))])
+
+    def rate_match_arrays(self, mu1, sigma1, mu2, sigma2, team1wins: int, team2wins: int):
+        if not self.supports():
+            return super().rate_match_arrays(mu1, sigma1, mu2, sigma2, team1wins, team2wins)
+
+        var1 = sigma1 ** 2
+        var2 = sigma2 ** 2
+        for team1_won in game_outcomes(team1wins, team2wins):
+            mu1, var1, mu2, var2 = self.rate_game(mu1, var1, mu2, var2, team1_won)
+        return mu1, np.sqrt(var1), mu2, np.sqrt(var2)
+
+    # every match plays game by game in lock step; a match with fewer games than the longest one keeps its
+    # ratings once its games run out, so each match gets exactly the result rate_match_arrays would give it
+    def rate_matches_arrays(self, mu1, sigma1, mu2, sigma2, team1wins, team2wins):
+        if not self.supports():
+            return super().rate_matches_arrays(mu1, sigma1, mu2, sigma2, team1wins, team2wins)
+
+        outcomes = [game_outcomes(int(w1), int(w2)) for w1, w2 in zip(team1wins, team2wins)]
+        var1 = sigma1 ** 2
+        var2 = sigma2 ** 2
+        for game in range(max(map(len, outcomes), default=0)):
+            played = np.array([game < len(o) for o in outcomes])[:, np.newaxis]
+            team1_won = np.array([o[game] if game < len(o) else True for o in outcomes])
+            new_mu1, new_var1, new_mu2, new_var2 = self.rate_game(mu1, var1, mu2, var2, team1_won)
+            mu1 = np.where(played, new_mu1, mu1)
+            var1 = np.where(played, new_var1, var1)
+            mu2 = np.where(played, new_mu2, mu2)
+            var2 = np.where(played, new_var2, var2)
+        return mu1, np.sqrt(var1), mu2, np.sqrt(var2)
+
+    def draw_margin(self, size: int) -> float:
+        if size not in self.draw_margins:
+            self.draw_margins[size] = trueskill.calc_draw_margin(self.env.draw_probability, size, self.env)
+        return self.draw_margins[size]
+
+    # one game: mu & var are arrays with players on the last axis, team1_won is a bool (or bool array
+    # matching the leading axes). any leading axes are rated independently.
+    def rate_game(self, mu1, var1, mu2, var2, team1_won):
+        size = mu1.shape[-1] + mu2.shape[-1]
+        return two_team_game(mu1, var1, mu2, var2, team1_won, self.env.beta, self.env.tau, self.draw_margin(size))
+
+
+# the closed-form update for one two team game. mu & var are arrays with players on the last axis, team1_won is
+# a bool (or bool array matching the leading axes), and beta, tau & draw_margin are numbers or arrays that
+# broadcast against the leading axes, eg one per model. any leading axes are rated independently.
+def two_team_game(mu1, var1, mu2, var2, team1_won, beta, tau, draw_margin=0.):
+    size = mu1.shape[-1] + mu2.shape[-1]
+
+    # the dynamics factor adds tau to every player before the game
+    tau2 = (np.asarray(tau) ** 2)[..., np.newaxis]
+    var1 = var1 + tau2
+    var2 = var2 + tau2
+
+    c2 = var1.sum(axis=-1) + var2.sum(axis=-1) + size * beta ** 2
+    c = np.sqrt(c2)
+    sign = np.where(team1_won, 1., -1.)
+    t = sign * (mu1.sum(axis=-1) - mu2.sum(axis=-1)) / c - draw_margin / c
+
+    denom = cdf(t)
+    v = np.where(denom > 0, pdf(t) / np.where(denom > 0, denom, 1.), -t)
+    w = v * (v + t)
+
+    mu_step = (sign * v / c)[..., np.newaxis]
+    var_step = (w / c2)[..., np.newaxis]
+    return (mu1 + var1 * mu_step,
+            var1 * (1 - var1 * var_step),
+            mu2 - var2 * mu_step,
+            var2 * (1 - var2 * var_step))
+
+
+class MultiModelEngine:
+    '''Rates the same matches for K models side by side, eg variants with different beta or tau. Every array has
+    a leading model axis, so each game is one update for all K models. envs are the models' trueskill environments,
+    which must have no draws; each model gets exactly the ratings TwoTeamEngine would give it.'''
+
+    def __init__(self, envs: []):
+        self.envs = envs
+        self.betas = np.array([env.beta for env in envs], dtype=float)
+        self.taus = np.array([env.tau for env in envs], dtype=float)
+        self.draw_margins = {}  # draw_margins[total players] = (models, 1) array of margins, always ~0
+
+    def draw_margin(self, size: int) -> np.ndarray:
+        if size not in self.draw_margins:
+            self.draw_margins[size] = np.array([trueskill.calc_draw_margin(env.draw_probability, size, env)
+                                                for env in self.envs])[:, np.newaxis]
+        return self.draw_margins[size]
+
+    # mu & sigma are (models, matches, players) arrays of independent matches, team1wins & team2wins have one
+    # entry per match. rated is an optional (models, matches) bool array; a model keeps its ratings for matches
+    # it doesn't rate. returns new (mu1, sigma1, mu2, sigma2) arrays of the same shapes
+    def rate_matches_arrays(self, mu1, sigma1, mu2, sigma2, team1wins, team2wins, rated=None):
+        outcomes = [game_outcomes(int(w1), int(w2)) for w1, w2 in zip(team1wins, team2wins)]
+        if rated is None:
+            rated = np.ones(mu1.shape[:2], dtype=bool)
+        beta = self.betas[:, np.newaxis]
+        tau = self.taus[:, np.newaxis]
+        draw_margin = self.draw_margin(mu1.shape[-1] + mu2.shape[-1])
+        var1 = sigma1 ** 2
+        var2 = sigma2 ** 2
+        for game in range(max(map(len, outcomes), default=0)):
+            played = (rated & np.array([game < len(o) for o in outcomes]))[..., np.newaxis]
+            team1_won = np.array([o[game] if game < len(o) else True for o in outcomes])
+            new_mu1, new_var1, new_mu2, new_var2 = two_team_game(mu1, var1, mu2, var2, team1_won, beta, tau, draw_margin)
+            mu1 = np.where(played, new_mu1, mu1)
+            var1 = np.where(played, new_var1, var1)
+            mu2 = np.where(played, new_mu2, mu2)
+            var2 = np.where(played, new_var2, var2)
+        return mu1, np.sqrt(var1), mu2, np.sqrt(var2)
+
+
+# rate a sequence of matches against a private copy of the ratings, eg in a worker process. mu & sigma are the
+# ratings of every player involved, matches are [(team1 indexes, team2 indexes, team1wins, team2wins), ...] into
+# them. teams of less than 5 are padded with bots. returns (mu1, sigma1, mu2, sigma2) arrays per match, bots left out
+def replay_matches(engine: RatingEngine, mu, sigma, matches: [], bot_mu: float, bot_sigma: float) -> []:
+    mu = mu.copy()
+    sigma = sigma.copy()
+    results = []
+    for team1, team2, team1wins, team2wins in matches:
+        bots1 = max(0, 5 - len(team1))
+        bots2 = max(0, 5 - len(team2))
+        mu1, sigma1, mu2, sigma2 = engine.rate_match_arrays(
+            np.concatenate((mu[team1], np.full(bots1, bot_mu))),
+            np.concatenate((sigma[team1], np.full(bots1, bot_sigma))),
+            np.concatenate((mu[team2], np.full(bots2, bot_mu))),
+            np.concatenate((sigma[team2], np.full(bots2, bot_sigma))),
+            team1wins, team2wins)
+        mu1, sigma1 = mu1[:len(team1)], sigma1[:len(team1)]
+        mu2, sigma2 = mu2[:len(team2)], sigma2[:len(team2)]
+        mu[team1] = mu1
+        sigma[team1] = sigma1
+        mu[team2] = mu2
+        sigma[team2] = sigma2
+        results.append((mu1, sigma1, mu2, sigma2))
+    return results
@@ -0,0 +1,70 @@
+import array
+import bisect
+import datetime
+
+from trueskill import Rating
+
+
+class RatingHistory:
+    '''Per player log of every rating update made by calculate_trueskills, kept in compact arrays
+    (match index, timestamp, mu, sigma) so any player's rating at any point can be found by binary search.
+
+    The log is keyed by PlayerModel id; the query methods take player names.'''
+
+    def __init__(self, model):
+        self.model = model  # PlayerModel, for player ids & the initial rating
+        self.match_indexes = {}  # match_indexes[player id] = array of indexes into KQTrueSkill.matches
+        self.timestamps = {}  # timestamps[player id] = array of match times, in POSIX seconds
+        self.mus = {}
+        self.sigmas = {}
+
+    # log the new ratings of a team after the match at self.matches[match_index]
+    def record_match(self, player_ids: [], match_index: int, time: datetime.datetime, mus: [], sigmas: []):
+        timestamp = time.timestamp()
+        for player_id, mu, sigma in zip(player_ids, mus, sigmas):
+            if player_id not in self.match_indexes:
+                self.match_indexes[player_id] = array.array('l')
+                self.timestamps[player_id] = array.array('d')
+                self.mus[player_id] = array.array('d')
+                self.sigmas[player_id] = array.array('d')
+            self.match_indexes[player_id].append(match_index)
+            self.timestamps[player_id].append(timestamp)
+            self.mus[player_id].append(mu)
+            self.sigmas[player_id].append(sigma)
+
+    # forget every update from self.matches[match_index] onwards
+    def truncate(self, match_index: int):
+        for player_id in self.match_indexes:
+            keep = bisect.bisect_left(self.match_indexes[player_id], match_index)
+            del self.match_indexes[player_id][keep:]
+            del self.timestamps[player_id][keep:]
+            del self.mus[player_id][keep:]
+            del self.sigmas[player_id][keep:]
+
+    def _rating_at_position(self, player_id: int, position: int) -> Rating:
+        if position == 0:
+            return self.model.initial_rating()
+        return Rating(mu=self.mus[player_id][position - 1], sigma=self.sigmas[player_id][position - 1])
+
+    # rating going into self.matches[match_index], ie after every earlier match
+    def rating_before_match(self, player: str, match_index: int) -> Rating:
+        player_id = self.model.id(player)
+        if player_id not in self.match_indexes:
+            return self.model.initial_rating()
+        return self._rating_at_position(player_id, bisect.bisect_left(self.match_indexes[player_id], match_index))
+
+    # rating as of a point in time, including matches that started at exactly that time
+    def rating_at(self, player: str, when: datetime.datetime) -> Rating:
+        player_id = self.model.id(player)
+        if player_id not in self.timestamps:
+            return self.model.initial_rating()
+        return self._rating_at_position(player_id, bisect.bisect_right(self.timestamps[player_id], when.timestamp()))
+
+    def ratings_before_match(self, players: [], match_index: int) -> []:
+        return [self.rating_before_match(player, match_index) for player in players]
+
+    def ratings_at(self, players: [], when: datetime.datetime) -> []:
+        return [self.rating_at(player, when) for player in players]
+
+    def update_count(self, player: str) -> int:
+        return len(self.match_indexes.get(self.model.id(player), ()))
@@ -0,0 +1,268 @@
+import concurrent.futures
+import math
+
+import numpy as np
+
+
+# chance of winning a best of best_of set, given the chance p of winning each game. works on arrays
+def set_win_probability(p, best_of: int = 1):
+    needed = best_of // 2 + 1
+    return sum(math.comb(needed - 1 + losses, losses) * p ** needed * (1 - p) ** losses for losses in range(needed))
+
+
+# seeds (1 based) in bracket position order, so seed 1 meets seed 2 only in the final: 1, 8, 4, 5, 2, 7, 3, 6
+def bracket_order(size: int) -> []:
+    order = [1]
+    while len(order) < size:
+        order = [seed for s in order for seed in (s, 2 * len(order) + 1 - s)]
+    return order
+
+
+# places from a finishing order where entrants in the same stage tie, eg everyone knocked out in the same round.
+# order & stages are parallel, best first; empty slots (-1) take no place
+def places_from_stages(order: np.ndarray, stages: []) -> np.ndarray:
+    stages = np.asarray(stages)
+    real = order >= 0
+    places = np.zeros(order.shape, dtype=np.int64)
+    better = np.zeros(len(order), dtype=np.int64)
+    for stage in np.unique(stages):
+        columns = stages == stage
+        places[:, columns] = (better + 1)[:, np.newaxis]
+        better += real[:, columns].sum(axis=1)
+    return places
+
+
+class MatchSampler:
+    '''Plays sets between arrays of teams, one per simulation, from a matrix of game win probabilities.
+    Team -1 is a bye, and loses to everyone.'''
+
+    def __init__(self, game_probabilities: np.ndarray, rng: np.random.Generator):
+        self.game_probabilities = game_probabilities  # [i, j] = chance team i beats team j in one game
+        self.set_probabilities = {}  # set_probabilities[best_of] = matrix like game_probabilities
+        self.rng = rng
+
+    # returns (winners, losers)
+    def play(self, team1: np.ndarray, team2: np.ndarray, best_of: int = 1):
+        if best_of not in self.set_probabilities:
+            self.set_probabilities[best_of] = set_win_probability(self.game_probabilities, best_of)
+        team1_wins = self.rng.random(team1.shape) < self.set_probabilities[best_of][team1, team2]
+        team1_wins = np.where(team2 < 0, True, np.where(team1 < 0, False, team1_wins))
+        return np.where(team1_wins, team1, team2), np.where(team1_wins, team2, team1)
+
+
+class SingleElimination:
+    '''Seeded single elimination bracket. Entrants are in seed order; missing seeds up to a power of 2 are byes.'''
+
+    def __init__(self, best_of: int = 1, final_best_of: int = None):
+        self.best_of = best_of
+        self.final_best_of = best_of if final_best_of is None else final_best_of
+
+    # entrants is (simulations, teams) in seed order. returns (order, places), both (simulations, slots), best first
+    def play(self, entrants: np.ndarray, sampler: MatchSampler):
+        alive = seeded_slots(entrants)
+        knocked_out = []
+        while alive.shape[1] > 1:
+            best_of = self.final_best_of if alive.shape[1] == 2 else self.best_of
+            alive, losers = sampler.play(alive[:, 0::2], alive[:, 1::2], best_of)
+            knocked_out.append(losers)
+
+        order = np.concatenate([alive] + knocked_out[::-1], axis=1)
+        stages = [0] + [i + 1 for i, losers in enumerate(knocked_out[::-1]) for _ in range(losers.shape[1])]
+        return order, places_from_stages(order, stages)
+
+
+class DoubleElimination:
+    '''Seeded double elimination bracket: a team is out after its second loss. Entrants are in seed order; missing
+    seeds up to a power of 2 are byes. Winners bracket losers drop into the losers bracket in alternating order to
+    put off rematches. final_best_of applies to the grand final, and with bracket_reset a grand final won by the
+    losers bracket team is played again.'''
+
+    def __init__(self, best_of: int = 1, final_best_of: int = None, bracket_reset: bool = True):
+        self.best_of = best_of
+        self.final_best_of = best_of if final_best_of is None else final_best_of
+        self.bracket_reset = bracket_reset
+
+    # entrants is (simulations, teams) in seed order. returns (order, places), both (simulations, slots), best first
+    def play(self, entrants: np.ndarray, sampler: MatchSampler):
+        winners = seeded_slots(entrants)
+        if winners.shape[1] == 2:  # too small for a losers bracket
+            return SingleElimination(self.best_of, self.final_best_of).play(entrants, sampler)
+        knocked_out = []  # everyone knocked out, one array per losers bracket round, earliest first
+
+        winners, dropped = sampler.play(winners[:, 0::2], winners[:, 1::2], self.best_of)
+        losers, out = sampler.play(dropped[:, 0::2], dropped[:, 1::2], self.best_of)
+        knocked_out.append(out)
+        winners_round = 2
+        while winners.shape[1] > 1:
+            winners, dropped = sampler.play(winners[:, 0::2], winners[:, 1::2], self.best_of)
+            if winners_round % 2 == 0:
+                dropped = dropped[:, ::-1]
+            losers, out = sampler.play(losers, dropped, self.best_of)
+            knocked_out.append(out)
+            if losers.shape[1] > 1:
+                losers, out = sampler.play(losers[:, 0::2], losers[:, 1::2], self.best_of)
+                knocked_out.append(out)
+            winners_round += 1
+
+        champion, runner_up = sampler.play(winners[:, 0], losers[:, 0], self.final_best_of)
+        if self.bracket_reset:
+            reset = champion != winners[:, 0]
+            reset_champion, reset_runner_up = sampler.play(champion, runner_up, self.final_best_of)
+            champion = np.where(reset, reset_champion, champion)
+            runner_up = np.where(reset, reset_runner_up, runner_up)
+
+        order = np.concatenate([champion[:, np.newaxis], runner_up[:, np.newaxis]] + knocked_out[::-1], axis=1)
+        stages = [0, 1] + [i + 2 for i, out in enumerate(knocked_out[::-1]) for _ in range(out.shape[1])]
+        return order, places_from_stages(order, stages)
+
+
+class GroupStage:
+    '''Round robin groups, snake seeded from the entrant order. Each group's top advance teams go on to bracket,
+    seeded group winners first, then runners up, and so on. Ties in group wins are broken at random.
+    Teams that don't advance tie with everyone who finished in the same group position.'''
+
+    def __init__(self, groups: int, advance: int, bracket, best_of: int = 1):
+        self.groups = groups
+        self.advance = advance
+        self.bracket = bracket
+        self.best_of = best_of
+
+    # entrants is (simulations, teams) in seed order. returns (order, places), both (simulations, teams), best first
+    def play(self, entrants: np.ndarray, sampler: MatchSampler):
+        simulations, teams = entrants.shape
+        snake = [[] for _ in range(self.groups)]
+        for seed in range(teams):
+            row = seed // self.groups
+            group = seed % self.groups if row % 2 == 0 else self.groups - 1 - seed % self.groups
+            snake[group].append(seed)
+
+        ranked = []  # ranked[group] = (simulations, group size) entrants in group finishing order
+        for members in snake:
+            group = entrants[:, members]
+            wins = np.zeros(group.shape)
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    winner, _ = sampler.play(group[:, i], group[:, j], self.best_of)
+                    wins[:, i] += winner == group[:, i]
+                    wins[:, j] += winner == group[:, j]
+            # random fractions break ties
+            finish = np.argsort(-(wins + sampler.rng.random(wins.shape)), axis=1)
+            ranked.append(np.take_along_axis(group, finish, axis=1))
+
+        positions = max(len(members) for members in snake)
+        by_position = [np.stack([group[:, position] for group in ranked if group.shape[1] > position], axis=1)
+                       for position in range(positions)]
+        order, places = self.bracket.play(np.concatenate(by_position[:self.advance], axis=1), sampler)
+        if self.advance < positions:
+            eliminated = by_position[self.advance:]
+            order = np.concatenate([order] + eliminated, axis=1)
+            stages = [0] * places.shape[1] + [i + 1 for i, e in enumerate(eliminated) for _ in range(e.shape[1])]
+            eliminated_places = places_from_stages(order, stages)[:, places.shape[1]:]
+            places = np.concatenate((places, eliminated_places), axis=1)
+        return order, places
+
+
+class Swiss:
+    '''Swiss rounds: each round pairs teams with the same record, ties in record ordered at random. Rematches are
+    possible. An odd team out gets a bye, which counts as a win. Teams finish in order of wins, ties sharing a place.'''
+
+    def __init__(self, rounds: int, best_of: int = 1):
+        self.rounds = rounds
+        self.best_of = best_of
+
+    # entrants is (simulations, teams). returns (order, places), both (simulations, slots), best first
+    def play(self, entrants: np.ndarray, sampler: MatchSampler):
+        if entrants.shape[1] % 2 == 1:
+            entrants = np.concatenate((entrants, np.full((len(entrants), 1), -1)), axis=1)
+        wins = np.zeros(entrants.shape)
+        slot = np.arange(entrants.shape[1])
+        for _ in range(self.rounds):
+            pairing = np.argsort(-(wins + 0.5 * sampler.rng.random(wins.shape)), axis=1)
+            team1 = np.take_along_axis(entrants, pairing[:, 0::2], axis=1)
+            team2 = np.take_along_axis(entrants, pairing[:, 1::2], axis=1)
+            winners, _ = sampler.play(team1, team2, self.best_of)
+            team1_won = (winners == team1).astype(float)
+            np.put_along_axis(wins, pairing[:, 0::2], np.take_along_axis(wins, pairing[:, 0::2], axis=1) + team1_won,
+                              axis=1)
+            np.put_along_axis(wins, pairing[:, 1::2],
+                              np.take_along_axis(wins, pairing[:, 1::2], axis=1) + 1 - team1_won, axis=1)
+
+        wins = np.where(entrants >= 0, wins, -1)
+        finish = np.argsort(-wins, axis=1, kind='stable')
+        order = np.take_along_axis(entrants, finish, axis=1)
+        finish_wins = np.take_along_axis(wins, finish, axis=1)
+        # place = 1 + teams with more wins, found by where each record starts in the sorted order
+        first = np.maximum.accumulate(np.where(
+            np.concatenate((np.ones((len(wins), 1), dtype=bool), finish_wins[:, 1:] != finish_wins[:, :-1]), axis=1),
+            slot, 0), axis=1)
+        return order, first + 1
+
+
+# entrants (seed order) placed into bracket positions, padded with byes (-1) to a power of 2
+def seeded_slots(entrants: np.ndarray) -> np.ndarray:
+    size = 1 << max(1, (entrants.shape[1] - 1).bit_length())
+    padded = np.full((len(entrants), size), -1, dtype=np.int64)
+    padded[:, :entrants.shape[1]] = entrants
+    return padded[:, np.array(bracket_order(size)) - 1]
+
+
+# run simulations of a tournament format. returns places, (simulations, teams), for teams 0 to teams - 1 entered
+# in seed order
+def simulate_places(tournament_format, game_probabilities: np.ndarray, simulations: int, seed) -> np.ndarray:
+    teams = len(game_probabilities)
+    sampler = MatchSampler(game_probabilities, np.random.default_rng(seed))
+    entrants = np.tile(np.arange(teams), (simulations, 1))
+    order, places = tournament_format.play(entrants, sampler)
+    # byes go to a spare column
+    team_places = np.zeros((simulations, teams + 1), dtype=np.int64)
+    np.put_along_axis(team_places, np.where(order >= 0, order, teams), places, axis=1)
+    return team_places[:, :teams]
+
+
+class SimulationResult:
+    '''Places from every simulated run of a tournament, places[simulation, team], 1 for the winner.'''
+
+    def __init__(self, team_names: [], places: np.ndarray):
+        self.team_names = team_names
+        self.places = places
+
+    # {team name: {place: probability}}, places in order
+    def placement_distribution(self) -> dict:
+        distribution = {}
+        for i, team in enumerate(self.team_names):
+            places, counts = np.unique(self.places[:, i], return_counts=True)
+            distribution[team] = {int(place): count / len(self.places) for place, count in zip(places, counts)}
+        return distribution
+
+    # {team name: probability of winning the tournament}
+    def win_probabilities(self) -> dict:
+        return {team: float(np.mean(self.places[:, i] == 1)) for i, team in enumerate(self.team_names)}
+
+    def expected_places(self) -> dict:
+        return {team: float(np.mean(self.places[:, i])) for i, team in enumerate(self.team_names)}
+
+
+class TournamentSimulator:
+    '''Monte Carlo placement odds for a tournament from current ratings. Game win probabilities come from
+    KQTrueSkill.win_probability_matrix, so rosters are padded with bots like win_probability_match.
+
+    teams is {team name: roster} in seed order, rosters as lists of playernames or player ids.
+    tournament_format is a SingleElimination, DoubleElimination, GroupStage or Swiss.'''
+
+    def __init__(self, history, teams: dict, tournament_format):
+        self.team_names = list(teams.keys())
+        self.tournament_format = tournament_format
+        self.game_probabilities = history.win_probability_matrix(list(teams.values()))
+
+    # processes > 1 splits the simulations over a process pool. seed makes runs repeatable
+    def run(self, simulations: int = 100000, processes: int = 1, seed: int = None) -> SimulationResult:
+        seeds = np.random.SeedSequence(seed).spawn(max(1, processes))
+        if processes <= 1:
+            places = simulate_places(self.tournament_format, self.game_probabilities, simulations, seeds[0])
+            return SimulationResult(self.team_names, places)
+
+        chunks = [simulations // processes + (1 if i < simulations % processes else 0) for i in range(processes)]
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            places = list(pool.map(simulate_places, [self.tournament_format] * processes,
+                                   [self.game_probabilities] * processes, chunks, seeds))
+        return SimulationResult(self.team_names, np.concatenate(places))
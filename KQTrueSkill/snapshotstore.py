@@ -0,0 +1,83 @@
+import bisect
+from collections.abc import Mapping
+
+from trueskill import Rating
+
+
+class SnapshotView(Mapping):
+    '''Read only view of every player's rating as of one snapshot. Looks ratings up in the store on demand.'''
+
+    def __init__(self, store, epoch: int):
+        self.store = store
+        self.epoch = epoch
+
+    def __getitem__(self, player: str) -> Rating:
+        return self.store.rating_at_epoch(player, self.epoch)
+
+    def __iter__(self):
+        return iter(self.store.initial_ratings)
+
+    def __len__(self):
+        return len(self.store.initial_ratings)
+
+    def __contains__(self, player):
+        return player in self.store.initial_ratings
+
+    def copy(self) -> dict:
+        return {player: self[player] for player in self}
+
+
+class SnapshotStore(Mapping):
+    '''Stores rating snapshots as deltas: each snapshot records only the ratings that changed since the
+    previous one. self.snapshots[tournament][player] still works, via SnapshotView.
+
+    Rating objects are never modified in place, so snapshots share them with the live ratings dict
+    instead of copying.'''
+
+    def __init__(self, initial_ratings: dict):
+        self.initial_ratings = dict(initial_ratings)  # initial_ratings[playername] = Rating before any snapshot
+        self.epochs = {}  # epochs[tournament] = index of the latest snapshot recorded for that tournament
+        self.epoch_count = 0
+        self.player_epochs = {}  # player_epochs[playername] = [epoch, ...] where the player's rating changed
+        self.player_ratings = {}  # player_ratings[playername] = [Rating, ...] parallel to player_epochs
+
+    def add_player(self, player: str, rating: Rating):
+        self.initial_ratings[player] = rating
+
+    # changed = {playername: Rating} for every player whose rating changed since the last snapshot
+    def record(self, tournament: str, changed: dict):
+        epoch = self.epoch_count
+        self.epoch_count += 1
+        for player, rating in changed.items():
+            if player in self.player_epochs:
+                self.player_epochs[player].append(epoch)
+                self.player_ratings[player].append(rating)
+            else:
+                self.player_epochs[player] = [epoch]
+                self.player_ratings[player] = [rating]
+        self.epochs[tournament] = epoch
+
+    # rewind to when only epoch_count snapshots had been recorded, and epochs was the tournament map
+    def truncate(self, epoch_count: int, epochs: dict):
+        for player in self.player_epochs:
+            keep = bisect.bisect_left(self.player_epochs[player], epoch_count)
+            del self.player_epochs[player][keep:]
+            del self.player_ratings[player][keep:]
+        self.epochs = dict(epochs)
+        self.epoch_count = epoch_count
+
+    def rating_at_epoch(self, player: str, epoch: int) -> Rating:
+        if player in self.player_epochs:
+            i = bisect.bisect_right(self.player_epochs[player], epoch)
+            if i > 0:
+                return self.player_ratings[player][i - 1]
+        return self.initial_ratings[player]
+
+    def __getitem__(self, tournament: str) -> SnapshotView:
+        return SnapshotView(self, self.epochs[tournament])
+
+    def __iter__(self):
+        return iter(self.epochs)
+
+    def __len__(self):
+        return len(self.epochs)
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import pickle
+import zlib
+
+# bump whenever the saved fields or the objects they hold change shape
+STATE_VERSION: int = 10
+
+# everything calculate_trueskills & the ingest methods build. saved together in one pickle so shared
+# references (the observers all hold history.teams) survive the round trip
+STATE_FIELDS: [] = [
+    'snapshots',
+    'unsnapshotted_players',
+    'rating_history',
+    'current_tournament',
+    'out_of_order_matches',
+    'matches',
+    'excluded_matches',
+    'ingested_rows',
+    'player_model',
+    'playerscenes',
+    'playerteams',
+    'playerratings',
+    'playertournaments',
+    'playergames',
+    'playerwins',
+    'playerlosses',
+    'incomplete_players',
+    'incomplete_teams',
+    'tournaments',
+    'tournamentdates',
+    'teams',
+    'tournament_ids',
+    'team_ids',
+    'rosters',
+    'ratings_change_by_opponent',
+    'ratings_change_by_teammate',
+    'predictions',
+    'observers',
+]
+
+
+# identifies the inputs a saved state was computed from: the contents of every dataset file,
+# the trueskill environment and the bot rating. any change invalidates the saved state
+def state_fingerprint(history, datasets: []) -> str:
+    sha = hashlib.sha1()
+    sha.update(f"version {STATE_VERSION}\n".encode())
+    env = history.rating_engine.env
+    bot = history.create_bot()
+    sha.update(f"env {env.mu} {env.sigma} {env.beta} {env.tau} {env.draw_probability}\n".encode())
+    sha.update(f"bot {bot.mu} {bot.sigma}\n".encode())
+    for playerfile, matchfile in datasets:
+        for filename in (playerfile, matchfile):
+            sha.update(f"file {filename}\n".encode())
+            with open(filename, 'rb') as f:
+                sha.update(f.read())
+    return sha.hexdigest()
+
+
+def save_state(history, filename: str, datasets: []):
+    state = {field: getattr(history, field) for field in STATE_FIELDS}
+    payload = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 1)
+    header = {'version': STATE_VERSION, 'fingerprint': state_fingerprint(history, datasets)}
+
+    # write to a temp file first so an interrupted save never leaves a truncated state behind
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as f:
+        pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.write(payload)
+    os.replace(tmp_filename, filename)
+
+
+# loads a saved state into history. returns False, leaving history untouched, if there's no saved state
+# or it was saved by another version or from different datasets
+def load_state(history, filename: str, datasets: []) -> bool:
+    if not os.path.exists(filename):
+        return False
+
+    with open(filename, 'rb') as f:
+        try:
+            header = pickle.load(f)
+        except (pickle.UnpicklingError, EOFError):
+            print(f"{filename} is not a saved state, ignoring it")
+            return False
+        if header.get('version') != STATE_VERSION:
+            print(f"{filename} was saved by state version {header.get('version')}, ignoring it")
+            return False
+        if header.get('fingerprint') != state_fingerprint(history, datasets):
+            print(f"datasets changed since {filename} was saved, ignoring it")
+            return False
+        state = pickle.loads(zlib.decompress(f.read()))
+
+    for field in STATE_FIELDS:
+        setattr(history, field, state[field])
+    return True
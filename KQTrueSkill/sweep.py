@@ -0,0 +1,198 @@
+import collections
+import concurrent.futures
+import heapq
+import itertools
+import os
+import random
+from dataclasses import dataclass, fields
+
+import numpy as np
+import trueskill
+
+from KQTrueSkill import KQTrueSkill, PredictionStats, match_time
+from matchscheduler import dependency_levels
+from ratingengine import MultiModelEngine, cdf
+
+
+@dataclass(frozen=True)
+class SweepConfig:
+    '''One set of model parameters to evaluate. The defaults are KQTrueSkill's. To run the full model with a
+    config, set the KQTrueSkill class attributes of the same names (and ingest with use_groups).'''
+    beta: float = KQTrueSkill.beta
+    tau: float = KQTrueSkill.tau
+    bot_mu: float = KQTrueSkill.bot_mu
+    bot_sigma: float = KQTrueSkill.bot_sigma
+    use_groups: bool = True
+
+
+@dataclass
+class SweepResult:
+    '''Prediction scores for one SweepConfig, see PredictionEvaluator. knockout only counts knockout bracket
+    games, which every config rates, so it compares configs with & without group stages on the same games.'''
+    config: SweepConfig
+    all: PredictionStats
+    knockout: PredictionStats
+
+
+# every combination of the given values, eg grid(beta=[2, 4, 6], use_groups=[True, False]). parameters left out
+# keep their defaults
+def grid(**values) -> []:
+    names = list(values.keys())
+    return [SweepConfig(**dict(zip(names, combination))) for combination in itertools.product(*values.values())]
+
+
+# count random configs. each parameter is a (low, high) tuple to draw uniformly from, a list of values to choose
+# from, or a single value; parameters left out keep their defaults
+def random_configs(count: int, seed: int = None, **ranges) -> []:
+    rng = random.Random(seed)
+
+    def draw(spec):
+        if isinstance(spec, tuple):
+            return rng.uniform(*spec)
+        if isinstance(spec, list):
+            return rng.choice(spec)
+        return spec
+
+    return [SweepConfig(**{name: draw(spec) for name, spec in ranges.items()}) for _ in range(count)]
+
+
+class SweepData:
+    '''A history's matches compiled for fast replays: rosters as padded arrays of player ids, with every match
+    put in the earliest batch its players allow (see dependency_levels) and batches split by team sizes. A replay
+    only tracks mu & sigma, so it's a fraction of the cost of calculate_trueskills.'''
+
+    def __init__(self, history: KQTrueSkill):
+        # group stage matches left out of history.matches come back, so one history serves every config
+        matches = list(heapq.merge(history.matches, sorted(history.excluded_matches, key=match_time), key=match_time))
+        self.initial_mu = history.player_model.initial_mu
+        self.initial_sigma = history.player_model.initial_sigma
+        self.players = history.player_model.size
+        self.rosters1 = [history.roster(m['tournament'], m['team1name']) for m in matches]
+        self.rosters2 = [history.roster(m['tournament'], m['team2name']) for m in matches]
+        self.team1wins = np.array([m['team1wins'] for m in matches], dtype=np.int64)
+        self.team2wins = np.array([m['team2wins'] for m in matches], dtype=np.int64)
+        self.knockout = np.array([m['bracket'] in history.knockout_brackets for m in matches])
+        self.batches = {}  # batches[use_groups] = [(rows, ids1, ids2), ...], see batches_for
+
+    # [(match rows, team 1 ids, team 2 ids), ...] in rating order. ids are (matches, max(5, roster)) arrays,
+    # -1 for a bot
+    def batches_for(self, use_groups: bool) -> []:
+        if use_groups not in self.batches:
+            rows = np.arange(len(self.knockout)) if use_groups else np.flatnonzero(self.knockout)
+            levels = dependency_levels([np.concatenate((self.rosters1[i], self.rosters2[i])).tolist()
+                                        for i in rows.tolist()])
+            by_shape = collections.defaultdict(list)
+            for level, i in zip(levels, rows.tolist()):
+                by_shape[(level, max(5, len(self.rosters1[i])), max(5, len(self.rosters2[i])))].append(i)
+
+            batches = []
+            for (_, width1, width2), batch_rows in sorted(by_shape.items()):
+                ids1 = np.full((len(batch_rows), width1), -1, dtype=np.int64)
+                ids2 = np.full((len(batch_rows), width2), -1, dtype=np.int64)
+                for row, i in enumerate(batch_rows):
+                    ids1[row, :len(self.rosters1[i])] = self.rosters1[i]
+                    ids2[row, :len(self.rosters2[i])] = self.rosters2[i]
+                batches.append((np.array(batch_rows), ids1, ids2))
+            self.batches[use_groups] = batches
+        return self.batches[use_groups]
+
+    # rate every match for each config in one pass, the configs side by side as the models of a MultiModelEngine,
+    # predicting each match from the ratings going into it like PredictionEvaluator. a config without group
+    # stages skips those matches. returns team 1's game win probability, (configs, matches), nan where skipped
+    def replay(self, configs: []) -> np.ndarray:
+        betas = np.array([config.beta for config in configs], dtype=float)
+        engine = MultiModelEngine([trueskill.TrueSkill(self.initial_mu, self.initial_sigma, config.beta, config.tau,
+                                                       draw_probability=0) for config in configs])
+        use_groups = np.array([config.use_groups for config in configs])
+        # ratings are (configs, players + 1), with each config's bot in the last slot so id -1 reads it
+        mu = np.full((len(configs), self.players + 1), self.initial_mu)
+        sigma = np.full((len(configs), self.players + 1), self.initial_sigma)
+        mu[:, -1] = [config.bot_mu for config in configs]
+        sigma[:, -1] = [config.bot_sigma for config in configs]
+
+        predictions = np.full((len(configs), len(self.knockout)), np.nan)
+        for rows, ids1, ids2 in self.batches_for(bool(use_groups.any())):
+            rated = use_groups[:, np.newaxis] | self.knockout[rows][np.newaxis, :]
+            mu1, sigma1, mu2, sigma2 = mu[:, ids1], sigma[:, ids1], mu[:, ids2], sigma[:, ids2]
+            size = ids1.shape[1] + ids2.shape[1]
+            predictions[:, rows] = np.where(rated, cdf((mu1.sum(axis=-1) - mu2.sum(axis=-1)) /
+                                                       np.sqrt(size * betas[:, np.newaxis] ** 2 +
+                                                               (sigma1 ** 2).sum(axis=-1) +
+                                                               (sigma2 ** 2).sum(axis=-1))), np.nan)
+            new_mu1, new_sigma1, new_mu2, new_sigma2 = engine.rate_matches_arrays(
+                mu1, sigma1, mu2, sigma2, self.team1wins[rows], self.team2wins[rows], rated)
+            players1 = ids1 >= 0
+            players2 = ids2 >= 0
+            mu[:, ids1[players1]] = new_mu1[:, players1]
+            sigma[:, ids1[players1]] = new_sigma1[:, players1]
+            mu[:, ids2[players2]] = new_mu2[:, players2]
+            sigma[:, ids2[players2]] = new_sigma2[:, players2]
+        return predictions
+
+    # a SweepResult per config, from one replay
+    def evaluate(self, configs: []) -> []:
+        results = []
+        for config, predictions in zip(configs, self.replay(configs)):
+            rated = ~np.isnan(predictions)
+            knockout = rated & self.knockout
+            results.append(SweepResult(config,
+                                       PredictionStats.from_arrays(predictions[rated], self.team1wins[rated],
+                                                                   self.team2wins[rated]),
+                                       PredictionStats.from_arrays(predictions[knockout], self.team1wins[knockout],
+                                                                   self.team2wins[knockout])))
+        return results
+
+
+# each worker process gets the compiled matches once, when it starts
+worker_data: SweepData = None
+
+
+def init_worker(data: SweepData):
+    global worker_data
+    worker_data = data
+
+
+def evaluate_in_worker(configs: []) -> []:
+    return worker_data.evaluate(configs)
+
+
+class ParameterSweep:
+    '''Scores model parameters by how well the ratings they produce predict each match. Configs are replayed
+    models_per_pass at a time, side by side in one pass over the history (see SweepData.replay), and the passes
+    are shared out over a pool of worker processes. The history's matches are compiled once and sent to each
+    worker once, rather than each run ingesting the datasets again.'''
+
+    def __init__(self, history: KQTrueSkill, processes: int = None, models_per_pass: int = 64):
+        self.data = SweepData(history)
+        self.processes = processes or os.cpu_count() or 1
+        self.models_per_pass = models_per_pass
+
+    # results in the same order as configs
+    def run(self, configs: []) -> []:
+        # compile once here rather than in every worker
+        self.data.batches_for(any(config.use_groups for config in configs))
+        # smaller passes if that's what it takes to give every worker one
+        per_pass = max(1, min(self.models_per_pass, -(-len(configs) // self.processes)))
+        passes = [configs[i:i + per_pass] for i in range(0, len(configs), per_pass)]
+        if self.processes <= 1 or len(passes) <= 1:
+            return [result for chunk in passes for result in self.data.evaluate(chunk)]
+
+        with concurrent.futures.ProcessPoolExecutor(self.processes, initializer=init_worker,
+                                                    initargs=(self.data,)) as pool:
+            return [result for results in pool.map(evaluate_in_worker, passes) for result in results]
+
+
+# score several model variants against one history in a single pass, eg compare_models(history,
+# [SweepConfig(), SweepConfig(use_groups=False), SweepConfig(beta=3.0)])
+def compare_models(history: KQTrueSkill, configs: []) -> []:
+    return SweepData(history).evaluate(configs)
+
+
+# one line per result, best knockout log-likelihood first
+def sweep_report(results: []) -> str:
+    lines = []
+    for result in sorted(results, key=lambda r: r.knockout.mean_log_likelihood(), reverse=True):
+        config = ", ".join(f"{f.name} {getattr(result.config, f.name):.4g}" if f.type is float
+                           else f"{f.name} {getattr(result.config, f.name)}" for f in fields(result.config))
+        lines.append(f"{config}: knockout {result.knockout}; all {result.all}")
+    return "\n".join(lines)
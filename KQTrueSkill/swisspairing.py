@@ -0,0 +1,76 @@
+import numpy as np
+
+from matching import max_weight_matching
+
+
+# wins per team and the pairs of teams that have already met, from the matches recorded for a tournament.
+# brackets limits it to those brackets, eg the Swiss rounds of an event that also has a knockout stage
+def tournament_standings(history, tournament: str, brackets: [] = None):
+    wins = {team: 0 for team in history.teams[tournament]}
+    played = set()
+    for match in history.matches:
+        if match["tournament"] != tournament or (brackets is not None and match["bracket"] not in brackets):
+            continue
+        team1, team2 = match["team1name"], match["team2name"]
+        if match["team1wins"] > match["team2wins"]:
+            wins[team1] += 1
+        elif match["team2wins"] > match["team1wins"]:
+            wins[team2] += 1
+        played.add(frozenset((team1, team2)))
+    return wins, played
+
+
+class SwissPairer:
+    '''Pairs a Swiss round as a maximum weight matching over the teams, so every team gets an opponent it
+    hasn't played before and the round as a whole is as fair as possible.
+
+    Pairing two teams scores their trueskill match quality (KQTrueSkill.match_quality_matrix, from current
+    ratings) minus record_weight for each win squared between their records. The default record_weight is high
+    enough that records always come first, and quality only chooses between pairings that are equally good by
+    record. With an odd number of teams, the team with the worst record that hasn't had a bye yet sits out.
+
+    teams is {team name: roster}, rosters as lists of playernames or player ids.'''
+
+    scale: int = 1000000  # weights are rounded to integers in millionths of a unit of match quality
+
+    def __init__(self, history, teams: dict, record_weight: float = None):
+        self.team_names = list(teams.keys())
+        self.quality = history.match_quality_matrix(list(teams.values()))
+        # every pairing's quality is at most 1, so a whole round's worth can't outweigh a single win of difference
+        self.record_weight = len(self.team_names) if record_weight is None else record_weight
+
+    # wins is {team name: wins so far}, missing teams on 0. played is pairs of team names that have already met,
+    # byes is teams that have had a bye. returns ([(team1, team2), ...], bye team or None), top tables first
+    def pair(self, wins: dict, played=(), byes=()):
+        n = len(self.team_names)
+        records = np.array([wins.get(team, 0) for team in self.team_names], dtype=float)
+        played = {frozenset(pair) for pair in played}
+        byes = set(byes)
+
+        gaps = (records[:, np.newaxis] - records[np.newaxis, :]) ** 2
+        weights = np.rint(self.scale * (self.quality - self.record_weight * gaps)).astype(np.int64)
+        edges = [(i, j, int(weights[i, j])) for i in range(n) for j in range(i + 1, n)
+                 if frozenset((self.team_names[i], self.team_names[j])) not in played]
+        if n % 2 == 1:
+            # the bye is vertex n, preferring the lowest record
+            bye_gaps = (records - records.min()) ** 2
+            edges += [(i, n, int(np.rint(-self.scale * self.record_weight * bye_gaps[i]))) for i in range(n)
+                      if self.team_names[i] not in byes]
+
+        mate = max_weight_matching(edges, max_cardinality=True) if edges else []
+        mate += [-1] * (n + n % 2 - len(mate))
+        if any(m == -1 for m in mate):
+            raise Exception(f"SwissPairer: no pairing of {n} teams avoids a rematch" +
+                            (" or a second bye" if n % 2 == 1 else ""))
+
+        bye = None
+        pairs = []
+        for i in range(n):
+            if mate[i] == n:
+                bye = self.team_names[i]
+            elif i < mate[i]:
+                # higher record as team 1, then team order
+                first, second = (i, mate[i]) if records[i] >= records[mate[i]] else (mate[i], i)
+                pairs.append((first, second))
+        pairs.sort(key=lambda pair: (-records[pair[0]], -records[pair[1]], pair[0]))
+        return [(self.team_names[i], self.team_names[j]) for i, j in pairs], bye
@@ -0,0 +1,30 @@
+import types
+
+import pytest
+from trueskill import Rating
+
+from draft import DraftOptimizer
+from playermodel import PlayerModel
+
+
+# just what DraftOptimizer reads from a KQTrueSkill history
+def make_history(players: []):
+    initial = Rating()
+    return types.SimpleNamespace(playerratings={p: Rating(mu=20 + i, sigma=5) for i, p in enumerate(players)},
+                                 player_model=PlayerModel(initial),
+                                 create_bot=lambda: Rating(mu=10, sigma=1))
+
+
+@pytest.mark.parametrize('pool, capacity', [(6, [3, 3]), (7, [4, 3]), (11, [4, 4, 3]), (15, [5, 5, 5])])
+def test_uneven_pools_spread_evenly(pool, capacity):
+    players = [f"player {i}" for i in range(pool)]
+    optimizer = DraftOptimizer(make_history(players), players, seed=1)
+    assert optimizer.capacity == capacity
+
+    result = optimizer.run(0.05)
+    assert sorted(len(team) for team in result.teams) == sorted(capacity)
+    assert sorted(p for team in result.teams for p in team) == sorted(players)
+    # every team is padded to 5 with bots: strengths are player mus plus 10 per missing player
+    ratings = make_history(players).playerratings
+    for team, strength in zip(result.teams, result.strengths):
+        assert strength == pytest.approx(sum(ratings[p].mu for p in team) + 10 * (5 - len(team)))
@@ -0,0 +1,79 @@
+import random
+import types
+
+import numpy as np
+import pytest
+
+from matching import max_weight_matching
+from swisspairing import SwissPairer
+
+
+# (edges matched, total weight) of the best matching, by trying every one
+def best_matching(vertex_count: int, edges: [], max_cardinality: bool):
+    weights = {frozenset((i, j)): weight for i, j, weight in edges}
+
+    def search(free: []):
+        if not free:
+            return 0, 0
+        v, rest = free[0], free[1:]
+        best = search(rest)  # v left unmatched
+        for u in rest:
+            if frozenset((v, u)) in weights:
+                count, weight = search([w for w in rest if w != u])
+                best = max(best, (count + 1, weight + weights[frozenset((v, u))]),
+                           key=lambda found: found if max_cardinality else found[1])
+        return best
+
+    found = search(list(range(vertex_count)))
+    return found if max_cardinality else found[1]
+
+
+@pytest.mark.parametrize('max_cardinality', [False, True])
+def test_max_weight_matching_against_brute_force(max_cardinality):
+    rng = random.Random(17)
+    for _ in range(300):
+        vertex_count = rng.randint(2, 8)
+        density = rng.random()
+        edges = [(i, j, rng.randint(-10, 30)) for i in range(vertex_count) for j in range(i + 1, vertex_count)
+                 if rng.random() < density]
+        if not edges:
+            continue
+        mate = max_weight_matching(edges, max_cardinality)
+        weights = {frozenset((i, j)): weight for i, j, weight in edges}
+        matched = [(v, m) for v, m in enumerate(mate) if m != -1 and v < m]
+        for v, m in enumerate(mate):
+            assert m == -1 or mate[m] == v
+        assert all(frozenset(pair) in weights for pair in matched)
+        found = (len(matched), sum(weights[frozenset(pair)] for pair in matched))
+        assert (found if max_cardinality else found[1]) == best_matching(len(mate), edges, max_cardinality)
+
+
+# a stand-in history, with every pairing equally good
+def make_pairer(team_names: []) -> SwissPairer:
+    history = types.SimpleNamespace(match_quality_matrix=lambda rosters: np.full((len(rosters),) * 2, 0.5))
+    return SwissPairer(history, {team: [] for team in team_names})
+
+
+def test_pairs_by_record_and_gives_the_worst_record_the_bye():
+    pairer = make_pairer(['A', 'B', 'C', 'D', 'E'])
+    pairs, bye = pairer.pair({'A': 2, 'B': 2, 'C': 1, 'D': 1, 'E': 0})
+    assert bye == 'E'
+    assert sorted(frozenset(pair) for pair in pairs) == sorted([frozenset('AB'), frozenset('CD')])
+
+    # E has had its bye, so the next lowest record sits out
+    pairs, bye = pairer.pair({'A': 2, 'B': 2, 'C': 1, 'D': 1, 'E': 0}, byes=['E'])
+    assert bye in ('C', 'D')
+    assert len(pairs) == 2 and all(bye not in pair for pair in pairs)
+
+
+def test_avoids_rematches_and_raises_when_it_cant():
+    pairer = make_pairer(['A', 'B', 'C', 'D'])
+    pairs, bye = pairer.pair({'A': 1, 'B': 1}, played=[('A', 'B'), ('C', 'D')])
+    assert bye is None
+    assert {frozenset(pair) for pair in pairs} in ({frozenset('AC'), frozenset('BD')},
+                                                    {frozenset('AD'), frozenset('BC')})
+
+    with pytest.raises(Exception, match="no pairing of 4 teams avoids a rematch"):
+        pairer.pair({}, played=[('A', 'B'), ('A', 'C'), ('A', 'D')])
+    with pytest.raises(Exception, match="no pairing of 3 teams avoids a rematch or a second bye"):
+        make_pairer(['A', 'B', 'C']).pair({}, byes=['A', 'B', 'C'])